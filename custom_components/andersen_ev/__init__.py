@@ -1,32 +1,94 @@
 """The Andersen EV integration."""
 import logging
 import asyncio
+import time
+import copy
 from datetime import timedelta
+from typing import Callable
 import json
 
 import voluptuous as vol
 
 # Import the konnect module from the local directory
 from .konnect.client import KonnectClient
+from .konnect.singleflight import SingleFlight
+from .konnect.status import (
+    DeviceStatus,
+    EVSE_STATE_CONNECTED,
+    EVSE_STATE_CHARGING,
+    EVSE_STATE_SLEEPING,
+    EVSE_STATE_DISABLED,
+)
+from .konnect.subscription import KonnectSubscription
+from .konnect.schedules import ScheduleWriter
+from .konnect.commands import CommandQueue
+from .konnect.exceptions import (
+    CommandSuperseded,
+    KonnectAuthError,
+    KonnectError,
+    KonnectTransportError,
+)
+from .konnect.deadline import Deadline
+from .konnect.status import DAYS, ScheduleSlot
+from .token_store import AndersenEvTokenStore, async_get_token_store
+from .history import AndersenEvChargeHistory, PERIODS
+from .statistics import AndersenEvStatisticsImporter
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant, ServiceCall
+from homeassistant.core import HomeAssistant, ServiceCall, callback
 from homeassistant.helpers.typing import ConfigType
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
 from homeassistant.const import Platform
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 from homeassistant.exceptions import ConfigEntryAuthFailed
-from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+import homeassistant.helpers.config_validation as cv
 
 from .const import (
     DOMAIN, 
     DEFAULT_SCAN_INTERVAL, 
+    DEFAULT_FAST_SCAN_INTERVAL,
+    DEFAULT_SLOW_SCAN_INTERVAL,
+    PLUG_IN_FAST_PERIOD,
+    CONF_FAST_SCAN_INTERVAL,
+    CONF_SLOW_SCAN_INTERVAL,
+    CONF_MAX_STALENESS,
+    DEFAULT_MAX_STALENESS,
+    DEFAULT_MAX_CONCURRENT_REQUESTS,
+    CONF_MAX_CONCURRENT_REQUESTS,
+    DEFAULT_LIVE_UPDATES,
+    DEFAULT_RECONCILE_INTERVAL,
+    LAST_CHARGE_TTL,
+    DEVICE_LIST_TTL,
+    STATUS_FRESHNESS,
+    LAST_CHARGE_KEY,
+    SCHEDULE_WRITE_WINDOW,
+    COMMAND_CONFIRM_DELAYS,
+    COMMAND_QUEUE_KEY,
+    STALE_KEY,
+    UPDATED_KEY,
+    POLL_DEADLINE,
+    HISTORY_SYNC_INTERVAL,
+    STATISTICS_IMPORT_INTERVAL,
+    HISTORY_DB_FILE,
+    CONF_LIVE_UPDATES,
     ATTR_DEVICE_ID,
-    STORAGE_VERSION,
-    STORAGE_KEY,
+    ATTR_PERIOD,
+    ATTR_START,
+    ATTR_END,
+    ATTR_SCHEDULES,
+    ATTR_INDEX,
+    ATTR_ENABLED,
+    ATTR_START_TIME,
+    ATTR_END_TIME,
+    ATTR_DAYS,
     SERVICE_DISABLE_ALL_SCHEDULES,
+    SERVICE_REFRESH_DEVICES,
     SERVICE_GET_DEVICE_INFO,
     SERVICE_GET_DEVICE_STATUS,
-    SERVICE_RCM_RESET
+    SERVICE_RCM_RESET,
+    SERVICE_GET_CHARGE_HISTORY,
+    SERVICE_SET_SCHEDULES
 )
 
 PLATFORMS = [Platform.LOCK, Platform.SENSOR, Platform.SWITCH]
@@ -43,82 +105,157 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     email = entry.data["email"]
     password = entry.data["password"]
 
-    # Create a storage manager for tokens
-    storage = Store(hass, STORAGE_VERSION, STORAGE_KEY)
-    token_data = await storage.async_load() or {}
+    # Get the token store shared by all entries
+    token_store = await async_get_token_store(hass)
     
-    # Create the client with stored tokens if available
-    client = KonnectClient(email, password)
+    # Create the client on HA's shared HTTP session, with stored tokens if available
+    client = KonnectClient(email, password, session=async_get_clientsession(hass))
     
     # If we have stored tokens, set them in the client
-    if entry.entry_id in token_data:
-        stored_tokens = token_data[entry.entry_id]
+    stored_tokens = token_store.get(entry.entry_id)
+    if stored_tokens:
         _LOGGER.debug("Found stored tokens for %s", email)
         client.token = stored_tokens.get("token")
         client.tokenType = stored_tokens.get("tokenType")
         client.tokenExpiresIn = stored_tokens.get("tokenExpiresIn")
         client.tokenExpiryTime = stored_tokens.get("tokenExpiryTime")
         client.refreshToken = stored_tokens.get("refreshToken")
+        client.username = stored_tokens.get("username")
 
-    coordinator = AndersenEvCoordinator(hass, client, storage, entry.entry_id)
+    # Local charge session index shared by all entries, rows are keyed by device
+    history = hass.data[DOMAIN].get("history")
+    if history is None:
+        history = hass.data[DOMAIN]["history"] = AndersenEvChargeHistory(hass, hass.config.path(HISTORY_DB_FILE))
+    
+    # Hourly energy statistics are only imported when the recorder is running. The
+    # importer is shared by all entries as its fetch progress is kept in one Store.
+    statistics = hass.data[DOMAIN].get("statistics")
+    if statistics is None and "recorder" in hass.config.components:
+        statistics = hass.data[DOMAIN]["statistics"] = AndersenEvStatisticsImporter(hass)
+    
+    coordinator = AndersenEvCoordinator(
+        hass, client, token_store, entry.entry_id,
+        history=history,
+        statistics=statistics,
+        max_concurrent_requests=entry.options.get(CONF_MAX_CONCURRENT_REQUESTS, DEFAULT_MAX_CONCURRENT_REQUESTS),
+        live_updates=entry.options.get(CONF_LIVE_UPDATES, DEFAULT_LIVE_UPDATES),
+        fast_scan_interval=entry.options.get(CONF_FAST_SCAN_INTERVAL, DEFAULT_FAST_SCAN_INTERVAL),
+        slow_scan_interval=entry.options.get(CONF_SLOW_SCAN_INTERVAL, DEFAULT_SLOW_SCAN_INTERVAL),
+        max_staleness=entry.options.get(CONF_MAX_STALENESS, DEFAULT_MAX_STALENESS)
+    )
     
     # Fetch initial data so we have data when entities subscribe
-    await coordinator.async_config_entry_first_refresh()
+    try:
+        await coordinator.async_config_entry_first_refresh()
+    except Exception:
+        # Don't leak the client's pooled HTTP session if setup is retried
+        await client.close()
+        raise
     
     hass.data[DOMAIN][entry.entry_id] = coordinator
     
+    # Start receiving pushed status updates between polls
+    coordinator.async_start_live_updates()
+    
     # Register services
     async def disable_all_schedules(call: ServiceCall) -> None:
         """Disable all schedules for a device."""
-        device_id = call.data.get(ATTR_DEVICE_ID)
-        devices = coordinator.data
-        
-        for device in devices:
-            if device.device_id == device_id:
-                await device.disable_all_schedules()
-                await coordinator.async_request_refresh()
-                break
+        device = coordinator.get_device(call.data.get(ATTR_DEVICE_ID))
+        if device is not None:
+            await coordinator.async_run_command(
+                device,
+                device.disable_all_schedules,
+                key="disable_all_schedules",
+                optimistic=lambda current: current._apply_schedule_slots({
+                    index: {**(slot or {}), "enabled": False}
+                    for index, slot in enumerate(current._last_status.get("scheduleSlotsArray") or [])
+                }),
+                confirmed=lambda status: not any(slot.enabled for slot in status.schedule_slots),
+                fields=("scheduleSlotsArray",),
+            )
     
     async def get_device_info(call: ServiceCall) -> dict:
         """Get detailed information for a device and return it to the UI."""
         device_id = call.data.get(ATTR_DEVICE_ID)
-        devices = coordinator.data
+        device = coordinator.get_device(device_id)
+        if device is None:
+            return {"error": f"Device with ID {device_id} not found"}
         
-        for device in devices:
-            if device.device_id == device_id:
-                device_info = await device.getDeviceInfo()
-                if device_info:
-                    # Return the device info as a response that will be shown in the UI
-                    return device_info
-                return {"error": "Failed to retrieve device information"}
-        
-        return {"error": f"Device with ID {device_id} not found"}
+        try:
+            # Return the device info as a response that will be shown in the UI
+            return await device.getDeviceInfo()
+        except KonnectError as err:
+            return {"error": f"Failed to retrieve device information: {err}"}
     
     async def get_device_status(call: ServiceCall) -> dict:
         """Get detailed status for a device and return it to the UI."""
         device_id = call.data.get(ATTR_DEVICE_ID)
-        devices = coordinator.data
+        device = coordinator.get_device(device_id)
+        if device is None:
+            return {"error": f"Device with ID {device_id} not found"}
         
-        for device in devices:
-            if device.device_id == device_id:
-                device_status = await device.getDetailedDeviceStatus()
-                if device_status:
-                    # Return the device status as a response that will be shown in the UI
-                    return device_status
-                return {"error": "Failed to retrieve device status"}
-        
-        return {"error": f"Device with ID {device_id} not found"}
+        try:
+            # Return the device status as a response that will be shown in the UI
+            return await device.getDetailedDeviceStatus()
+        except KonnectError as err:
+            return {"error": f"Failed to retrieve device status: {err}"}
     
-    async def reset_rcm(call: ServiceCall) -> None:
-        """Reset RCM fault for a device."""
+    async def get_charge_history(call: ServiceCall) -> dict:
+        """Return charge session totals for a device from the local history index."""
         device_id = call.data.get(ATTR_DEVICE_ID)
-        devices = coordinator.data
+        device = coordinator.get_device(device_id)
+        if device is None:
+            return {"error": f"Device with ID {device_id} not found"}
         
-        for device in devices:
-            if device.device_id == device_id:
-                await device.reset_rcm()
-                await coordinator.async_request_refresh()
-                break
+        # Make sure the index holds something before the first scheduled sync has run
+        await coordinator.async_sync_history(device, only_if_never_synced=True)
+        
+        period = call.data.get(ATTR_PERIOD)
+        totals = await coordinator.history.async_totals(
+            device_id, period, call.data.get(ATTR_START), call.data.get(ATTR_END)
+        )
+        return {"device_id": device_id, "period": period, "totals": totals}
+    
+    async def set_schedules(call: ServiceCall) -> None:
+        """Change several schedule slots of a device in one mutation."""
+        device_id = call.data.get(ATTR_DEVICE_ID)
+        device = coordinator.get_device(device_id)
+        if device is None:
+            _LOGGER.warning(f"Device with ID {device_id} not found")
+            return
+        
+        schedule_slots = {}
+        for change in call.data[ATTR_SCHEDULES]:
+            index = change[ATTR_INDEX]
+            slot = schedule_slots.get(index) or await coordinator.async_get_schedule_slot(device, index)
+            if slot is None:
+                _LOGGER.warning(f"Schedule index {index} not found for {device.friendly_name}")
+                return
+            if ATTR_ENABLED in change:
+                slot["enabled"] = change[ATTR_ENABLED]
+            if ATTR_START_TIME in change:
+                slot["startHour"] = change[ATTR_START_TIME].hour
+                slot["startMinute"] = change[ATTR_START_TIME].minute
+            if ATTR_END_TIME in change:
+                slot["endHour"] = change[ATTR_END_TIME].hour
+                slot["endMinute"] = change[ATTR_END_TIME].minute
+            if ATTR_DAYS in change:
+                slot["dayMap"] = {day: day in change[ATTR_DAYS] for day in DAYS}
+            schedule_slots[index] = slot
+        
+        # Every slot goes in the same mutation, so they are applied together or not at all
+        await coordinator.async_set_schedules(device, schedule_slots)
+    
+    async def reset_rcm(call: ServiceCall) -> None:
+        """Reset RCM fault for a device."""
+        device = coordinator.get_device(call.data.get(ATTR_DEVICE_ID))
+        if device is not None:
+            # Nothing to show up front, just refresh this one device once it's done
+            await coordinator.async_run_command(device, device.reset_rcm, key="reset_rcm")
+    
+    async def refresh_devices(call: ServiceCall) -> None:
+        """Look for chargers added to or removed from the account."""
+        await coordinator.async_refresh_devices()
     
     # Register services using simpler schema
     service_schema = vol.Schema({vol.Required(ATTR_DEVICE_ID): str})
@@ -137,27 +274,75 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         DOMAIN, SERVICE_GET_DEVICE_STATUS, get_device_status, schema=service_schema, supports_response=True
     )
 
+    # Register the get_charge_history service with response support
+    history_schema = vol.Schema({
+        vol.Required(ATTR_DEVICE_ID): str,
+        vol.Optional(ATTR_PERIOD, default="month"): vol.In(list(PERIODS)),
+        vol.Optional(ATTR_START): str,
+        vol.Optional(ATTR_END): str,
+    })
+    hass.services.async_register(
+        DOMAIN, SERVICE_GET_CHARGE_HISTORY, get_charge_history, schema=history_schema, supports_response=True
+    )
+
+    # Register the set_schedules service
+    set_schedules_schema = vol.Schema({
+        vol.Required(ATTR_DEVICE_ID): str,
+        vol.Required(ATTR_SCHEDULES): vol.All(cv.ensure_list, [vol.Schema({
+            vol.Required(ATTR_INDEX): vol.All(vol.Coerce(int), vol.Range(min=0)),
+            vol.Optional(ATTR_ENABLED): cv.boolean,
+            vol.Optional(ATTR_START_TIME): cv.time,
+            vol.Optional(ATTR_END_TIME): cv.time,
+            vol.Optional(ATTR_DAYS): vol.All(cv.ensure_list, [vol.In(DAYS)]),
+        })]),
+    })
+    hass.services.async_register(
+        DOMAIN, SERVICE_SET_SCHEDULES, set_schedules, schema=set_schedules_schema
+    )
+
     # Register the reset_rcm service
     hass.services.async_register(
         DOMAIN, SERVICE_RCM_RESET, reset_rcm, schema=service_schema
     )
+
+    # Register the refresh_devices service
+    hass.services.async_register(
+        DOMAIN, SERVICE_REFRESH_DEVICES, refresh_devices, schema=vol.Schema({})
+    )
+    
+    # Reload the entry when options are changed
+    entry.async_on_unload(entry.add_update_listener(async_reload_entry))
     
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
     return True
 
+async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Reload a config entry after its options change."""
+    await hass.config_entries.async_reload(entry.entry_id)
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     
     if unload_ok:
-        hass.data[DOMAIN].pop(entry.entry_id)
+        coordinator = hass.data[DOMAIN].pop(entry.entry_id)
+        await coordinator.async_stop_live_updates()
+        await coordinator.async_cancel_background_jobs()
+        await coordinator.client.close()
         
     return unload_ok
 
 class AndersenEvCoordinator(DataUpdateCoordinator):
     """Data update coordinator for Andersen EV."""
 
-    def __init__(self, hass: HomeAssistant, client: KonnectClient, storage: Store, entry_id: str) -> None:
+    def __init__(self, hass: HomeAssistant, client: KonnectClient, token_store: AndersenEvTokenStore, entry_id: str,
+                 history: AndersenEvChargeHistory | None = None,
+                 statistics: AndersenEvStatisticsImporter | None = None,
+                 max_concurrent_requests: int = DEFAULT_MAX_CONCURRENT_REQUESTS,
+                 live_updates: bool = DEFAULT_LIVE_UPDATES,
+                 fast_scan_interval: int = DEFAULT_FAST_SCAN_INTERVAL,
+                 slow_scan_interval: int = DEFAULT_SLOW_SCAN_INTERVAL,
+                 max_staleness: int = DEFAULT_MAX_STALENESS) -> None:
         """Initialize the coordinator."""
         super().__init__(
             hass,
@@ -167,112 +352,719 @@ class AndersenEvCoordinator(DataUpdateCoordinator):
         )
         self.client = client
         self.devices = []
+        # device_id -> KonnectDevice index so entities don't have to scan the device list
+        self.devices_by_id = {}
         self.auth_failures = 0
         self.max_auth_failures = 3
-        self.storage = storage
+        self.token_store = token_store
         self.entry_id = entry_id
+        # Bounds how many per-device status requests run at the same time
+        self._request_semaphore = asyncio.Semaphore(max(1, int(max_concurrent_requests)))
+        # Websocket subscription for pushed status changes, polling becomes reconciliation
+        self.subscription = None
+        if live_updates:
+            self.subscription = KonnectSubscription(client, self._handle_pushed_update, self._handle_live_health)
+        # Last charge session per device id, shared by all energy and cost sensors
+        self.last_charges = {}
+        self._last_charge_fetched = {}
+        self._last_charge_flight = SingleFlight()
+        # Adaptive polling: fast while charging/just plugged in, slow while idle
+        self.fast_scan_interval = fast_scan_interval
+        self.slow_scan_interval = slow_scan_interval
+        self._evse_states = {}
+        self._plugged_in_at = {}
+        # deviceStatus fields read by each enabled entity, used to trim the status query
+        self._entity_status_fields = {}
+        # Coalesces forced per-device status refreshes from entity updates
+        self._status_fetched = {}
+        # When the device list was last fetched, it only changes when chargers are added or removed
+        self._devices_fetched = None
+        self._status_flight = SingleFlight()
+        # Incremental charge session history, synced in the background
+        self.history = history
+        self._history_synced = {}
+        self._history_flight = SingleFlight()
+        # Energy statistics backfilled from binned power logs, also in the background
+        self.statistics = statistics
+        self._statistics_imported = {}
+        self._statistics_flight = SingleFlight()
+        # What entities last saw per device, and the keys that changed since, so
+        # listeners only write state when a value they read actually changed
+        self._published_status = {}
+        self._published_charges = {}
+        self._changes = {}
+        # Per-device writers that gather schedule changes into one mutation
+        self._schedule_writers = {}
+        # device_id -> [status before the first change in the writer's open window]
+        self._schedule_batches = {}
+        # Per-device queues that send mutations one at a time
+        self.command_queues = {}
+        # (device_id, key) -> status snapshot of the queued command not sent yet
+        self._unsent_snapshots = {}
+        # Devices whose status couldn't be refreshed by the last poll
+        self.stale_devices = set()
+        # When the cloud last confirmed each device's status, and each of its
+        # fields, so failed polls can keep serving it for up to max_staleness
+        self.max_staleness = timedelta(seconds=max_staleness)
+        self.device_updated = {}
+        self.field_updated = {}
 
     async def _async_update_data(self):
         """Fetch data from API endpoint with automatic token refresh."""
         try:
-            # Reset auth failures counter on successful updates
-            if self.devices:
-                self.auth_failures = 0
-
-            # Get devices
-            devices = await self.client.getDevices()
+            return await self._async_poll()
+        except ConfigEntryAuthFailed as auth_err:
+            # Pass this through to trigger re-authentication
+            raise auth_err
+        except KonnectAuthError as err:
+            # Only a rejected login or token is worth a fresh SRP sign-in
+            _LOGGER.error("Authentication error: %s", str(err))
             
-            # Save tokens after successful API call
-            await self._save_tokens()
+            # Increment auth failures counter
+            self.auth_failures += 1
             
-            if not devices:
-                _LOGGER.warning("No devices found")
+            # If we exceed the max failures, raise an auth exception
+            if self.auth_failures >= self.max_auth_failures:
+                _LOGGER.error("Multiple authentication failures, requesting re-authentication")
+                self.auth_failures = 0
+                raise ConfigEntryAuthFailed("Authentication failed") from err
                 
-                # Increment auth failures counter
-                self.auth_failures += 1
+            # Try a full re-authentication
+            try:
+                await self.client.reauthenticate(full=True)
+                _LOGGER.info("Re-authentication successful")
                 
-                # If we exceed the max failures, raise an auth exception
-                # This will trigger a config entry reload
-                if self.auth_failures >= self.max_auth_failures:
-                    _LOGGER.error("Multiple authentication failures, requesting re-authentication")
-                    self.auth_failures = 0
-                    raise ConfigEntryAuthFailed("Persistent authentication failures")
+                # Save new tokens after successful re-authentication
+                await self._save_tokens()
+            except KonnectError as auth_err:
+                _LOGGER.error("Re-authentication failed: %s", str(auth_err))
+            else:
+                # Try again with the new token, once
+                try:
+                    return await self._async_poll()
+                except KonnectError as retry_err:
+                    _LOGGER.error("Update failed after re-authentication: %s", str(retry_err))
                 
-                # If we still have existing devices from previous update, return those
-                if self.devices:
-                    _LOGGER.info("Using cached device data")
-                    return self.devices
+            return self._serve_stale(err)
+        except Exception as err:
+            # Rate limits, network trouble, outages and unexpected responses
+            # won't be fixed by signing in again, the next poll just has to wait
+            return self._serve_stale(err)
+
+    def _serve_stale(self, err: Exception):
+        """Keep serving the last good devices through a failed poll, raising UpdateFailed once they expire.
+
+        Entities stay available, flagged as stale, so a short cloud outage
+        doesn't turn every entity unavailable and back. Polling carries on at
+        the normal interval and clears the flag once a poll gets through.
+        """
+        if not any(not self.is_expired(device.device_id) for device in self.devices):
+            raise UpdateFailed(f"Error communicating with Andersen EV API: {err}") from err
+        _LOGGER.warning(f"Update failed, showing the last known status until the next poll: {err}")
+        self._update_stale({device.device_id for device in self.devices})
+        return self.devices
+
+    async def _async_poll(self):
+        """Fetch the devices and their status for one update."""
+        # Reset auth failures counter on successful updates
+        if self.devices:
+            self.auth_failures = 0
+
+        # Every request this poll makes shares one time budget
+        deadline = Deadline(POLL_DEADLINE)
+        
+        # Get devices, reusing the known list until DEVICE_LIST_TTL runs out
+        fetched = self._devices_fetched
+        if self.devices and fetched is not None and time.monotonic() - fetched < DEVICE_LIST_TTL:
+            devices = self.devices
+        else:
+            try:
+                devices = await self.client.getDevices(deadline)
+            except KonnectTransportError as err:
+                if not self.devices:
+                    raise
+                _LOGGER.warning(f"Couldn't list devices ({err}), polling the known devices instead")
+                devices = self.devices
+            else:
+                if devices:
+                    self._devices_fetched = time.monotonic()
+                if devices and self.devices and self.devices_by_id.keys() != {device.device_id for device in devices}:
+                    # Entities are created per device at setup, so start over with the new list
+                    _LOGGER.info("Andersen EV device list changed, reloading")
+                    self.hass.async_create_task(self.hass.config_entries.async_reload(self.entry_id))
+        
+        # Save tokens after successful API call
+        await self._save_tokens()
+        
+        if not devices:
+            _LOGGER.warning("No devices found")
             
-            # Cache the devices for potential future use
-            self.devices = devices
+            # Increment auth failures counter
+            self.auth_failures += 1
             
-            # For each device, fetch the current status
-            for device in devices:
-                _LOGGER.debug(f"Device ID: {device.device_id}, Name: {device.friendly_name}, User Lock: {device.user_lock}")
-                
-                # Fetch and log device status
-                try:
-                    device_status = await device.getDetailedDeviceStatus()
-                    if device_status:
-                        _LOGGER.debug(f"Device Status for {device.friendly_name}: evseState={device_status.get('evseState')}, online={device_status.get('online')}, charging={device_status.get('sysChargingEnabled')}, locked={device_status.get('sysUserLock')}")
-                except Exception as status_err:
-                    _LOGGER.debug(f"Error getting device status for {device.friendly_name}: {status_err}")
+            # If we exceed the max failures, raise an auth exception
+            # This will trigger a config entry reload
+            if self.auth_failures >= self.max_auth_failures:
+                _LOGGER.error("Multiple authentication failures, requesting re-authentication")
+                self.auth_failures = 0
+                raise ConfigEntryAuthFailed("Persistent authentication failures")
             
-            return devices
-        except ConfigEntryAuthFailed as auth_err:
-            # Pass this through to trigger re-authentication
-            raise auth_err
+            # If we still have existing devices from previous update, return those
+            if self.devices:
+                _LOGGER.info("Using cached device data")
+                return self.devices
+        
+        # Forget what entities saw of devices that have gone away
+        current = {device.device_id for device in devices}
+        for device_id in self._published_status.keys() - current:
+            self._published_status.pop(device_id, None)
+            self._published_charges.pop(device_id, None)
+            self.device_updated.pop(device_id, None)
+            self.field_updated.pop(device_id, None)
+        
+        # getDevices updates known devices in place, so only a changed list needs handing on
+        if devices is not self.devices:
+            self.devices = devices
+            self.devices_by_id = {device.device_id: device for device in devices}
+            if self.subscription is not None:
+                self.subscription.set_devices(devices)
+        
+        # Fetch the status of every device in one batched request where possible
+        updated = await self.client.getDevicesStatus(devices, self.status_fields, deadline)
+        if updated is None:
+            updated = set()
+        now = time.monotonic()
+        for device_id in updated:
+            self._status_fetched[device_id] = now
+            self._mark_updated(device_id, self.devices_by_id[device_id]._last_status)
+        
+        # Fall back to concurrent individual requests for devices the batch didn't cover
+        pending = [device for device in devices if device.device_id not in updated]
+        if pending:
+            statuses = await asyncio.gather(
+                *(self._async_fetch_device_status(device, deadline) for device in pending))
+            updated |= {device.device_id for device, status in zip(pending, statuses) if status is not None}
+        
+        # Whatever wasn't refreshed keeps its previous status, marked as stale
+        stale = {device.device_id for device in devices} - updated
+        if stale and deadline.expired:
+            _LOGGER.warning(f"Poll deadline of {POLL_DEADLINE} seconds ran out, "
+                            f"{len(stale)} device(s) kept their previous status")
+        
+        for device in devices:
+            _LOGGER.debug(f"Device ID: {device.device_id}, Name: {device.friendly_name}, User Lock: {device.user_lock}")
+            device_status = device._last_status
+            if device_status:
+                _LOGGER.debug(f"Device Status for {device.friendly_name}: evseState={device_status.get('evseState')}, online={device_status.get('online')}, charging={device_status.get('sysChargingEnabled')}, locked={device_status.get('sysUserLock')}")
+            self._track_state_changes(device)
+        
+        # Refresh the last charge data once per TTL for all sensors, or straight
+        # away when a charging session has just finished
+        await asyncio.gather(*(self.async_get_last_charge(device, deadline=deadline) for device in devices))
+        
+        self._schedule_background_jobs(devices)
+        # The next poll is timed once this one finishes, so it picks the new interval up
+        self._adjust_update_interval()
+        for device in devices:
+            self._collect_changes(device)
+        self._update_stale(stale)
+        return devices
+    
+    async def async_refresh_devices(self) -> None:
+        """Fetch the device list on the next poll, and poll now.
+
+        Adding or removing a charger reloads the entry so its entities follow.
+        """
+        self._devices_fetched = None
+        await self.async_refresh()
+
+    def get_device(self, device_id):
+        """Return the current KonnectDevice for an id, or None if it is gone."""
+        return self.devices_by_id.get(device_id)
+
+    def get_status(self, device_id) -> DeviceStatus | None:
+        """Return the last known status snapshot for a device."""
+        device = self.devices_by_id.get(device_id)
+        if device is None:
+            return None
+        return device.status
+
+    @callback
+    def async_register_status_fields(self, key: str, fields) -> Callable[[], None]:
+        """Register the deviceStatus fields an entity reads; returns an unregister callback."""
+        self._entity_status_fields[key] = frozenset(fields)
+        
+        @callback
+        def _unregister() -> None:
+            self._entity_status_fields.pop(key, None)
+        
+        return _unregister
+
+    @property
+    def status_fields(self) -> frozenset | None:
+        """Fields polled for each device, or None to fetch everything.
+
+        Only entities enabled in the entity registry get added to hass and
+        register here, so disabled entities don't cost any response size.
+        """
+        if not self._entity_status_fields:
+            return None
+        return frozenset().union(*self._entity_status_fields.values())
+
+    def _collect_changes(self, device) -> set | None:
+        """Diff a device against what entities last saw and queue the changed keys.
+
+        Returns the changed keys, or None if everything counts as changed.
+        """
+        device_id = device.device_id
+        status = device.status
+        last_charge = self.last_charges.get(device_id)
+        if device_id not in self._published_status:
+            # Nothing published yet, so every key counts as changed
+            changed = None
+        else:
+            previous = self._published_status[device_id]
+            if status is None or previous is None:
+                changed = set() if status is previous else None
+            else:
+                changed = set(status.diff(previous))
+            if changed is not None and last_charge != self._published_charges.get(device_id):
+                changed.add(LAST_CHARGE_KEY)
+        self._published_status[device_id] = status
+        self._published_charges[device_id] = last_charge
+        
+        pending = self._changes.get(device_id, frozenset())
+        if changed is None or pending is None:
+            self._changes[device_id] = None
+        elif changed:
+            self._changes[device_id] = pending | changed
+        return changed
+
+    def has_changes(self, device_id, keys) -> bool:
+        """Return whether any of the given keys changed for a device in this update."""
+        changed = self._changes.get(device_id, frozenset())
+        return changed is None or not changed.isdisjoint(keys)
+
+    @callback
+    def async_update_listeners(self) -> None:
+        """Notify listeners, then forget the changes they have now seen."""
+        super().async_update_listeners()
+        self._changes = {}
+
+    @callback
+    def async_start_live_updates(self) -> None:
+        """Start the live status subscription for the known devices."""
+        if self.subscription is not None and self.devices:
+            self.subscription.start(self.devices)
+
+    async def async_stop_live_updates(self) -> None:
+        """Stop the live status subscription."""
+        if self.subscription is not None:
+            await self.subscription.stop()
+
+    @callback
+    def _handle_pushed_update(self, device) -> None:
+        """Push a subscription update for a device out to the entities."""
+        _LOGGER.debug(f"Live status update received for {device.friendly_name}")
+        self._track_state_changes(device)
+        if self._adjust_update_interval():
+            # The pending poll was timed with the longer interval
+            self._request_refresh_soon()
+        # A push only carries the fields that changed
+        changed = self._collect_changes(device)
+        if changed is None:
+            fields = device._last_status or ()
+        else:
+            fields = {key.split(".")[0] for key in changed if key != LAST_CHARGE_KEY}
+        self._mark_updated(device.device_id, fields)
+        # Notify listeners without rescheduling the next reconciliation poll
+        self.async_update_listeners()
+
+    @callback
+    def _handle_live_health(self, healthy: bool) -> None:
+        """Slow polling down while pushed updates are flowing."""
+        _LOGGER.debug(f"Live updates {'connected' if healthy else 'disconnected'}")
+        if self._adjust_update_interval():
+            # Don't leave the next poll waiting on a reconciliation timer set while live
+            self._request_refresh_soon()
+
+    def _track_state_changes(self, device) -> None:
+        """Note plug-in and end-of-charge transitions for a device."""
+        state = device.status.evse_state if device.status else None
+        previous = self._evse_states.get(device.device_id)
+        self._evse_states[device.device_id] = state
+        if previous is None or state == previous:
+            return
+        
+        plugged_in = (EVSE_STATE_CONNECTED, EVSE_STATE_CHARGING)
+        if state in plugged_in and previous not in plugged_in:
+            _LOGGER.debug(f"{device.friendly_name} plugged in, polling faster")
+            self._plugged_in_at[device.device_id] = time.monotonic()
+        if previous == EVSE_STATE_CHARGING:
+            # A session just ended, so the last charge data and history are out of date
+            self._last_charge_fetched.pop(device.device_id, None)
+            self._history_synced.pop(device.device_id, None)
+
+    def _adjust_update_interval(self) -> bool:
+        """Pick the polling interval from the current state of the chargers.
+
+        Returns whether the interval got shorter. The new interval only applies
+        from the next scheduled poll, so callers outside a refresh should bring
+        that poll forward with _request_refresh_soon.
+        """
+        now = time.monotonic()
+        self._plugged_in_at = {
+            device_id: plugged_in_at for device_id, plugged_in_at in self._plugged_in_at.items()
+            if now - plugged_in_at < PLUG_IN_FAST_PERIOD
+        }
+        statuses = [device.status for device in self.devices if device.status]
+        active = bool(self._plugged_in_at) or any(status.is_charging for status in statuses)
+        idle = bool(statuses) and all(
+            not status.online or status.evse_state in (EVSE_STATE_SLEEPING, EVSE_STATE_DISABLED)
+            for status in statuses)
+        
+        if active:
+            interval = self.fast_scan_interval
+        elif idle:
+            interval = self.slow_scan_interval
+        else:
+            interval = DEFAULT_SCAN_INTERVAL
+        
+        # Pushed updates cover everything but live power figures, so only poll to reconcile
+        if not active and self.subscription is not None and self.subscription.healthy:
+            interval = max(interval, DEFAULT_RECONCILE_INTERVAL)
+        
+        new_interval = timedelta(seconds=interval)
+        if self.update_interval == new_interval:
+            return False
+        _LOGGER.debug(f"Polling interval set to {interval} seconds")
+        shorter = self.update_interval is not None and new_interval < self.update_interval
+        self.update_interval = new_interval
+        return shorter
+
+    @callback
+    def _request_refresh_soon(self) -> None:
+        """Poll now (debounced), so the next poll is timed with the current interval."""
+        self.hass.async_create_task(self.async_request_refresh())
+
+    async def async_get_last_charge(self, device, force: bool = False, deadline: Deadline | None = None):
+        """Return the last charge session for a device, fetching it at most once per TTL.
+
+        Concurrent callers for the same device share a single request.
+        """
+        fetched = self._last_charge_fetched.get(device.device_id)
+        if not force and fetched is not None and time.monotonic() - fetched < LAST_CHARGE_TTL:
+            return self.last_charges.get(device.device_id)
+        return await self._last_charge_flight.run(
+            device.device_id, lambda: self._async_fetch_last_charge(device, deadline))
+
+    async def _async_fetch_last_charge(self, device, deadline: Deadline | None = None):
+        """Fetch and cache the last charge session for a device."""
+        async with self._request_semaphore:
+            try:
+                last_charge = await device.getLastCharge(deadline)
+            except KonnectError as err:
+                _LOGGER.debug(f"Error getting last charge for {device.friendly_name}: {err}")
+                last_charge = None
+        
+        self._last_charge_fetched[device.device_id] = time.monotonic()
+        if last_charge is not None:
+            self.last_charges[device.device_id] = last_charge
+        return self.last_charges.get(device.device_id)
+
+    @callback
+    def _schedule_background_jobs(self, devices) -> None:
+        """Start background history syncs and statistics imports for devices that are due one.
+
+        The entry's tasks only wait on the shared flights, so unloading calls
+        async_cancel_background_jobs to stop the work itself before the client
+        it uses is closed.
+        """
+        entry = self.hass.config_entries.async_get_entry(self.entry_id)
+        if entry is None:
+            return
+        now = time.monotonic()
+        for device in devices:
+            if self.history is not None and self._is_due(
+                    device, self._history_synced, self._history_flight, HISTORY_SYNC_INTERVAL, now):
+                entry.async_create_background_task(
+                    self.hass, self.async_sync_history(device), f"{DOMAIN} history sync {device.device_id}"
+                )
+            if self.statistics is not None and self._is_due(
+                    device, self._statistics_imported, self._statistics_flight, STATISTICS_IMPORT_INTERVAL, now):
+                entry.async_create_background_task(
+                    self.hass,
+                    self._statistics_flight.run(device.device_id, lambda device=device: self._async_import_statistics(device)),
+                    f"{DOMAIN} statistics import {device.device_id}"
+                )
+
+    async def async_cancel_background_jobs(self) -> None:
+        """Cancel any history sync or statistics import still running."""
+        await asyncio.gather(self._history_flight.cancel(), self._statistics_flight.cancel())
+
+    @staticmethod
+    def _is_due(device, done: dict, flight: SingleFlight, interval: int, now: float) -> bool:
+        last = done.get(device.device_id)
+        if last is not None and now - last < interval:
+            return False
+        return not flight.in_flight(device.device_id)
+
+    async def async_sync_history(self, device, only_if_never_synced: bool = False) -> None:
+        """Sync new charge sessions for a device into the local history index."""
+        if self.history is None:
+            return
+        if only_if_never_synced and device.device_id in self._history_synced:
+            return
+        await self._history_flight.run(device.device_id, lambda: self._async_sync_history(device))
+
+    async def _async_sync_history(self, device) -> None:
+        try:
+            await self.history.async_sync(device)
         except Exception as err:
-            # Check if this is an authentication error
-            if "Failed to sign in" in str(err) or "Authentication failed" in str(err) or "Unauthorized" in str(err) or "401" in str(err):
-                _LOGGER.error("Authentication error: %s", str(err))
-                
-                # Increment auth failures counter
-                self.auth_failures += 1
-                
-                # If we exceed the max failures, raise an auth exception
-                if self.auth_failures >= self.max_auth_failures:
-                    _LOGGER.error("Multiple authentication failures, requesting re-authentication")
-                    self.auth_failures = 0
-                    raise ConfigEntryAuthFailed("Authentication failed") from err
-                    
-                # Try a full re-authentication
-                try:
-                    await self.client.authenticate_user()
-                    _LOGGER.info("Re-authentication successful")
-                    
-                    # Save new tokens after successful re-authentication
-                    await self._save_tokens()
-                    
-                    # Try again with the new token
-                    return await self._async_update_data()
-                except Exception as auth_err:
-                    _LOGGER.error("Re-authentication failed: %s", str(auth_err))
-                    
-                # If we still have existing devices from previous update, return those
-                if self.devices:
-                    _LOGGER.info("Using cached device data")
-                    return self.devices
-                    
-            raise UpdateFailed(f"Error communicating with Andersen EV API: {err}")
+            _LOGGER.debug(f"Error syncing charge history for {device.friendly_name}: {err}")
+        # Retried on the next interval either way, rather than on every poll
+        self._history_synced[device.device_id] = time.monotonic()
+
+    async def _async_import_statistics(self, device) -> None:
+        try:
+            await self.statistics.async_import(device)
+        except Exception as err:
+            _LOGGER.debug(f"Error importing statistics for {device.friendly_name}: {err}")
+        self._statistics_imported[device.device_id] = time.monotonic()
+
+    async def async_get_schedule_slot(self, device, index: int) -> dict | None:
+        """Return a copy of a device's raw schedule slot, fetching it if it isn't known."""
+        slots = (device._last_status or {}).get("scheduleSlotsArray")
+        if not slots:
+            device_info = await device.getDeviceInfo()
+            slots = ((device_info or {}).get("deviceStatus") or {}).get("scheduleSlotsArray")
+        if not slots or len(slots) <= index:
+            return None
+        return copy.deepcopy(slots[index] or {})
+
+    async def async_set_schedules(self, device, schedule_slots: dict) -> bool:
+        """Write schedule slots, given as {index: slot}, through the device's coalescing writer.
+
+        Changes made within SCHEDULE_WRITE_WINDOW seconds share one setSchedules
+        mutation, and their confirmation polls share the same status requests.
+        """
+        writer = self._schedule_writers.get(device.device_id)
+        if writer is None:
+            writer = ScheduleWriter(device, SCHEDULE_WRITE_WINDOW, self.get_command_queue(device.device_id))
+            self._schedule_writers[device.device_id] = writer
+        # A device that left the list and came back is a new object
+        writer.device = device
+        # Every change in the window fails together, so they share one snapshot
+        # taken before the first of them; later ones already hold its change
+        if not writer.window_open or device.device_id not in self._schedule_batches:
+            self._schedule_batches[device.device_id] = []
+        batch = self._schedule_batches[device.device_id]
+        expected = {index: ScheduleSlot.from_dict(slot) for index, slot in schedule_slots.items()}
+        
+        def confirmed(status: DeviceStatus) -> bool:
+            return all(
+                index < len(status.schedule_slots) and status.schedule_slots[index] == slot
+                for index, slot in expected.items())
+        
+        # The writer queues its combined mutation itself
+        return await self.async_run_command(
+            device,
+            lambda: writer.write(schedule_slots),
+            optimistic=lambda current: current._apply_schedule_slots(schedule_slots),
+            confirmed=confirmed,
+            queued=False,
+            fields=("scheduleSlotsArray",),
+            batch=batch,
+        )
+
+    def get_command_queue(self, device_id) -> CommandQueue:
+        """Return the queue that serializes a device's mutations."""
+        queue = self.command_queues.get(device_id)
+        if queue is None:
+            queue = CommandQueue(
+                device_id, lambda: self._mark_changed(device_id, COMMAND_QUEUE_KEY))
+            self.command_queues[device_id] = queue
+        return queue
+
+    async def async_run_command(self, device, command, key=None, optimistic=None, confirmed=None,
+                                queued: bool = True, fields=(), batch=None) -> bool:
+        """Run a device command and confirm it against that device alone.
+
+        The command goes through the device's CommandQueue under key, so a
+        newer command with the same key that arrives while it waits replaces it.
+        optimistic(device) updates the local status before the command is sent
+        so entities show the change straight away. The device is then polled
+        with a short backoff until confirmed(status) holds; if it never does,
+        entities go back to the state the charger actually reports. fields
+        names the deviceStatus fields confirmed reads, so those polls fetch
+        them even when no entity has registered them. Commands sent in one
+        mutation pass the same batch list, which holds the status from before
+        the first of them, so a failure rolls them all back to that.
+        """
+        if batch is None:
+            snapshot = copy.deepcopy(device._last_status)
+        else:
+            if not batch:
+                batch.append(copy.deepcopy(device._last_status))
+            snapshot = batch[0]
+        unsent_key = (device.device_id, key)
+        if queued and key is not None:
+            superseded = self._unsent_snapshots.get(unsent_key)
+            if superseded is not None:
+                # The command this one replaces is never sent, so roll back to
+                # what came before its optimistic change rather than to it
+                snapshot = superseded[0]
+            unsent = [snapshot]
+            self._unsent_snapshots[unsent_key] = unsent
+        
+        async def send():
+            if queued and key is not None and self._unsent_snapshots.get(unsent_key) is unsent:
+                del self._unsent_snapshots[unsent_key]
+            return await command()
+        
+        if optimistic is not None and device._last_status:
+            optimistic(device)
+            self._publish(device)
+        
+        try:
+            if queued:
+                await self.get_command_queue(device.device_id).run(key, send)
+            else:
+                await command()
+        except CommandSuperseded:
+            # The newer command shows and confirms its own state
+            return False
+        except KonnectError as err:
+            _LOGGER.warning(f"Command for {device.friendly_name} failed: {err}")
+            self._rollback(device, snapshot)
+            return False
+        
+        status = None
+        for delay in COMMAND_CONFIRM_DELAYS:
+            await asyncio.sleep(delay)
+            # Check the current object in case the device list was refetched meanwhile
+            device = self.get_device(device.device_id) or device
+            status = await self._status_flight.run(
+                (device.device_id, frozenset(fields)) if fields else device.device_id,
+                lambda device=device: self._async_fetch_device_status(device, fields=fields))
+            if status is None:
+                continue
+            if confirmed is None or confirmed(device.status):
+                self._publish(device)
+                return True
+        
+        _LOGGER.warning(f"Change to {device.friendly_name} was not confirmed by the charger, rolling back")
+        self._rollback(device, snapshot, fetched=status is not None)
+        return False
+
+    def _rollback(self, device, snapshot, fetched: bool = False) -> None:
+        """Drop an optimistic change, keeping a status fetched since if there is one."""
+        if not fetched:
+            device._last_status = snapshot
+            device._invalidate_status()
+        self._publish(device)
+
+    @callback
+    def _mark_changed(self, device_id, key) -> None:
+        """Tell the entities reading a non-status key that it changed."""
+        pending = self._changes.get(device_id, frozenset())
+        if pending is not None:
+            self._changes[device_id] = pending | {key}
+        self.async_update_listeners()
+
+    @callback
+    def _publish(self, device) -> None:
+        """Push one device's local status out to the entities."""
+        self._collect_changes(device)
+        self.async_update_listeners()
+
+    async def async_refresh_device(self, device):
+        """Refresh one device's status on demand and push it to all its entities.
+
+        A fetch already in flight, or one finished within STATUS_FRESHNESS
+        seconds, is reused rather than sending another request.
+        """
+        fetched = self._status_fetched.get(device.device_id)
+        if fetched is not None and time.monotonic() - fetched < STATUS_FRESHNESS:
+            return device._last_status
+        return await self._status_flight.run(device.device_id, lambda: self._async_refresh_device(device))
+
+    async def _async_refresh_device(self, device):
+        """Fetch a device's status and notify listeners once."""
+        status = await self._async_fetch_device_status(device)
+        if status is not None:
+            self._publish(device)
+        return status
+
+    async def _async_fetch_device_status(self, device, deadline: Deadline | None = None, fields=()):
+        """Fetch the status of one device, isolating its failures from the others.
+
+        fields are fetched on top of the registered status fields.
+        """
+        status_fields = self.status_fields
+        if status_fields is not None and fields:
+            status_fields = status_fields | frozenset(fields)
+        async with self._request_semaphore:
+            try:
+                status = await device.getDetailedDeviceStatus(status_fields, deadline)
+            except KonnectError as status_err:
+                _LOGGER.debug(f"Error getting device status for {device.friendly_name}: {status_err!r}")
+                return None
+        if status is not None:
+            self._status_fetched[device.device_id] = time.monotonic()
+            self._mark_updated(device.device_id, status)
+            if device.device_id in self.stale_devices:
+                self._update_stale(self.stale_devices - {device.device_id})
+        return status
+
+    def _update_stale(self, stale: set) -> None:
+        """Record which devices are showing a status that couldn't be refreshed."""
+        for device_id in stale ^ self.stale_devices:
+            pending = self._changes.get(device_id, frozenset())
+            if pending is not None:
+                self._changes[device_id] = pending | {STALE_KEY}
+        self.stale_devices = stale
+
+    def is_stale(self, device_id) -> bool:
+        """Return whether a device's status is left over from an earlier poll."""
+        return device_id in self.stale_devices
+
+    def _mark_updated(self, device_id, fields) -> None:
+        """Record that the cloud just confirmed a device's status and the given fields of it."""
+        now = dt_util.utcnow()
+        self.device_updated[device_id] = now
+        field_updated = self.field_updated.setdefault(device_id, {})
+        for field in fields:
+            field_updated[field] = now
+        pending = self._changes.get(device_id, frozenset())
+        if pending is not None:
+            self._changes[device_id] = pending | {UPDATED_KEY}
+
+    def is_expired(self, device_id) -> bool:
+        """Return whether a device's last good status is too old to keep showing.
+
+        Staleness is counted from when the next poll was due, so a slow polling
+        interval doesn't expire a status that simply hasn't been polled yet.
+        """
+        updated = self.device_updated.get(device_id)
+        if updated is None:
+            return False
+        return dt_util.utcnow() - updated > self.max_staleness + self.update_interval
     
     async def _save_tokens(self):
-        """Save authentication tokens to persistent storage."""
+        """Save authentication tokens to persistent storage if they changed."""
         try:
-            # Load existing data
-            token_data = await self.storage.async_load() or {}
-            
-            # Update with current client tokens
-            token_data[self.entry_id] = {
+            tokens = {
                 "token": self.client.token,
                 "tokenType": self.client.tokenType,
                 "tokenExpiresIn": self.client.tokenExpiresIn,
                 "tokenExpiryTime": self.client.tokenExpiryTime,
-                "refreshToken": self.client.refreshToken
+                "refreshToken": self.client.refreshToken,
+                "username": self.client.username
             }
             
-            # Save back to storage
-            await self.storage.async_save(token_data)
-            _LOGGER.debug("Auth tokens saved to persistent storage")
+            # Only schedules a (delayed) write when something differs from what's stored
+            if self.token_store.async_set(self.entry_id, tokens):
+                _LOGGER.debug("Auth tokens queued for persistent storage")
         except Exception as err:
-            _LOGGER.warning("Failed to save auth tokens: %s", str(err))
\ No newline at end of file
+            _LOGGER.warning("Failed to save auth tokens: %s", str(err))
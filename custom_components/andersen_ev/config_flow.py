@@ -4,13 +4,29 @@ import voluptuous as vol
 
 # Import the konnect module from the local directory
 from .konnect.client import KonnectClient
+from .konnect.exceptions import KonnectAuthError, KonnectError
 
 from homeassistant import config_entries
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.data_entry_flow import FlowResult
 from homeassistant.exceptions import HomeAssistantError
-
-from .const import DOMAIN, CONF_EMAIL, CONF_PASSWORD
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+
+from .const import (
+    DOMAIN,
+    CONF_EMAIL,
+    CONF_PASSWORD,
+    CONF_MAX_CONCURRENT_REQUESTS,
+    CONF_LIVE_UPDATES,
+    CONF_FAST_SCAN_INTERVAL,
+    CONF_SLOW_SCAN_INTERVAL,
+    CONF_MAX_STALENESS,
+    DEFAULT_MAX_CONCURRENT_REQUESTS,
+    DEFAULT_LIVE_UPDATES,
+    DEFAULT_FAST_SCAN_INTERVAL,
+    DEFAULT_SLOW_SCAN_INTERVAL,
+    DEFAULT_MAX_STALENESS,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -26,9 +42,10 @@ async def validate_input(hass: HomeAssistant, data):
 
     Data has the keys from STEP_USER_DATA_SCHEMA with values provided by the user.
     """
-    # Validate the credentials by attempting to sign in
+    # Validate the credentials by attempting to sign in. HA's shared session is
+    # used so this throwaway client leaves no connection pool behind.
+    client = KonnectClient(data[CONF_EMAIL], data[CONF_PASSWORD], session=async_get_clientsession(hass))
     try:
-        client = KonnectClient(data[CONF_EMAIL], data[CONF_PASSWORD])
         await client.authenticate_user()
         devices = await client.getDevices()
         
@@ -37,11 +54,14 @@ async def validate_input(hass: HomeAssistant, data):
         
         # Return info to be stored in the config entry
         return {"title": f"Andersen EV ({data[CONF_EMAIL]})"}
-    except Exception as e:
+    except KonnectAuthError as e:
         _LOGGER.error("Authentication error: %s", str(e))
-        if "Incorrect email address" in str(e) or "Failed to sign in" in str(e):
-            raise InvalidAuth from e
+        raise InvalidAuth from e
+    except KonnectError as e:
+        _LOGGER.error("Error connecting to Andersen EV: %s", str(e))
         raise CannotConnect from e
+    finally:
+        await client.close()
 
 
 class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
@@ -68,6 +88,48 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             step_id="user", data_schema=STEP_USER_DATA_SCHEMA, errors=errors
         )
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry):
+        """Get the options flow for this handler."""
+        return OptionsFlowHandler()
+
+
+class OptionsFlowHandler(config_entries.OptionsFlow):
+    """Handle Andersen EV options."""
+
+    async def async_step_init(self, user_input=None) -> FlowResult:
+        """Manage the options."""
+        if user_input is not None:
+            return self.async_create_entry(title="", data=user_input)
+
+        options = self.config_entry.options
+        data_schema = vol.Schema(
+            {
+                vol.Optional(
+                    CONF_MAX_CONCURRENT_REQUESTS,
+                    default=options.get(CONF_MAX_CONCURRENT_REQUESTS, DEFAULT_MAX_CONCURRENT_REQUESTS),
+                ): vol.All(vol.Coerce(int), vol.Range(min=1, max=20)),
+                vol.Optional(
+                    CONF_LIVE_UPDATES,
+                    default=options.get(CONF_LIVE_UPDATES, DEFAULT_LIVE_UPDATES),
+                ): bool,
+                vol.Optional(
+                    CONF_FAST_SCAN_INTERVAL,
+                    default=options.get(CONF_FAST_SCAN_INTERVAL, DEFAULT_FAST_SCAN_INTERVAL),
+                ): vol.All(vol.Coerce(int), vol.Range(min=10, max=60)),
+                vol.Optional(
+                    CONF_SLOW_SCAN_INTERVAL,
+                    default=options.get(CONF_SLOW_SCAN_INTERVAL, DEFAULT_SLOW_SCAN_INTERVAL),
+                ): vol.All(vol.Coerce(int), vol.Range(min=60, max=3600)),
+                vol.Optional(
+                    CONF_MAX_STALENESS,
+                    default=options.get(CONF_MAX_STALENESS, DEFAULT_MAX_STALENESS),
+                ): vol.All(vol.Coerce(int), vol.Range(min=60, max=86400)),
+            }
+        )
+        return self.async_show_form(step_id="init", data_schema=data_schema)
+
 
 class CannotConnect(HomeAssistantError):
     """Error to indicate we cannot connect."""
@@ -5,22 +5,69 @@ DOMAIN = "andersen_ev"
 # Configuration
 CONF_EMAIL = "email"
 CONF_PASSWORD = "password"
+CONF_MAX_CONCURRENT_REQUESTS = "max_concurrent_requests"
+CONF_LIVE_UPDATES = "live_updates"
+CONF_FAST_SCAN_INTERVAL = "fast_scan_interval"
+CONF_SLOW_SCAN_INTERVAL = "slow_scan_interval"
+CONF_MAX_STALENESS = "max_staleness"
 
 # Defaults
 DEFAULT_SCAN_INTERVAL = 60  # seconds
+DEFAULT_FAST_SCAN_INTERVAL = 15  # seconds, while charging or just after plug-in
+DEFAULT_SLOW_SCAN_INTERVAL = 300  # seconds, while every charger is sleeping, disabled or offline
+PLUG_IN_FAST_PERIOD = 300  # seconds of fast polling after a car is plugged in
+DEFAULT_MAX_CONCURRENT_REQUESTS = 4  # per-device status requests in flight at once
+DEFAULT_LIVE_UPDATES = True
+DEFAULT_MAX_STALENESS = 1800  # seconds a device's last good status is served past a missed poll
+DEFAULT_RECONCILE_INTERVAL = 900  # seconds between polls while live updates are connected
+LAST_CHARGE_TTL = 300  # seconds the last charge session data is reused
+DEVICE_LIST_TTL = 3600  # seconds the account's device list is reused between polls
+LAST_CHARGE_KEY = "lastCharge"  # change key for the last charge session, alongside deviceStatus keys
+COMMAND_QUEUE_KEY = "commandQueue"  # change key for a device's command queue figures
+STALE_KEY = "stale"  # change key for a device's status going stale or fresh again
+UPDATED_KEY = "updated"  # change key for the cloud confirming a device's status
+POLL_DEADLINE = 30  # seconds every request in one poll has to finish in
+STATUS_FRESHNESS = 5  # seconds a device status is reused by forced entity updates
+SCHEDULE_WRITE_WINDOW = 0.5  # seconds schedule changes are gathered into one mutation
+COMMAND_CONFIRM_DELAYS = (0.5, 1, 2, 4)  # seconds between polls confirming a command on its device
+HISTORY_PAGE_SIZE = 50  # charge sessions fetched per history sync request
+HISTORY_SYNC_INTERVAL = 3600  # seconds between charge history syncs per device
+STATISTICS_IMPORT_INTERVAL = 3600  # seconds between long-term statistics imports per device
+STATISTICS_BACKFILL_DAYS = 90  # days of power logs imported the first time
+STATISTICS_WINDOW_DAYS = 7  # days of power logs requested per window
+STATISTICS_PAGE_SIZE = 200  # power log bins fetched per request
+STATISTICS_SETTLE_HOURS = 2  # recent hours left alone, the cloud may still be filling their bins in
 
 # Services
 SERVICE_DISABLE_ALL_SCHEDULES = "disable_all_schedules"
 SERVICE_GET_DEVICE_INFO = "get_device_info"
 SERVICE_GET_DEVICE_STATUS = "get_device_status"
 SERVICE_RCM_RESET = "reset_rcm"
+SERVICE_GET_CHARGE_HISTORY = "get_charge_history"
+SERVICE_SET_SCHEDULES = "set_schedules"
+SERVICE_REFRESH_DEVICES = "refresh_devices"
 
 # Storage
 STORAGE_VERSION = 1
 STORAGE_KEY = f"{DOMAIN}.auth_tokens"
+TOKEN_SAVE_DELAY = 30  # seconds, coalesces token changes into one write
+STATISTICS_STORAGE_KEY = f"{DOMAIN}.statistics"
+STATISTICS_SAVE_DELAY = 60  # seconds, coalesces fetched-until changes into one write
+HISTORY_DB_FILE = f"{DOMAIN}_history.db"
 
 # Attributes
 ATTR_DEVICE_ID = "device_id"
+ATTR_STALE = "stale"
+ATTR_FIELDS_UPDATED = "fields_updated"
+ATTR_PERIOD = "period"
+ATTR_START = "start"
+ATTR_END = "end"
+ATTR_SCHEDULES = "schedules"
+ATTR_INDEX = "index"
+ATTR_ENABLED = "enabled"
+ATTR_START_TIME = "start_time"
+ATTR_END_TIME = "end_time"
+ATTR_DAYS = "days"
 ATTR_DURATION = "duration"
 ATTR_CHARGE_COST_TOTAL = "charge_cost_total"
 ATTR_CHARGE_ENERGY_TOTAL = "charge_energy_total"
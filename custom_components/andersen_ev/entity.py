@@ -0,0 +1,51 @@
+"""Base entity for Andersen EV."""
+from __future__ import annotations
+
+from homeassistant.core import callback
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+
+from .const import ATTR_STALE, STALE_KEY
+
+
+class AndersenEvEntity(CoordinatorEntity):
+    """Coordinator entity that only writes its state when something it reads changed."""
+
+    # deviceStatus fields this entity reads
+    _status_fields = ()
+    _written_available = None
+
+    @property
+    def _source_keys(self):
+        """Change keys reported by the coordinator that affect this entity's state."""
+        return self._status_fields
+
+    async def async_added_to_hass(self) -> None:
+        """When entity is added to hass."""
+        await super().async_added_to_hass()
+        # Make sure the coordinator's status query includes the fields we read
+        if self._status_fields:
+            self.async_on_remove(
+                self.coordinator.async_register_status_fields(self.unique_id, self._status_fields)
+            )
+
+    @property
+    def available(self) -> bool:
+        """Available while the coordinator is, until the device's last good status expires."""
+        return super().available and not self.coordinator.is_expired(self._device.device_id)
+
+    @property
+    def extra_state_attributes(self):
+        """Flag values left over from an earlier poll."""
+        if self.coordinator.is_stale(self._device.device_id):
+            return {ATTR_STALE: True}
+        return None
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Write state only if availability, staleness or one of our source keys changed."""
+        available = self.available
+        if (available == self._written_available
+                and not self.coordinator.has_changes(self._device.device_id, (*self._source_keys, STALE_KEY))):
+            return
+        self._written_available = available
+        self.async_write_ha_state()
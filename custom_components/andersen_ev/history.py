@@ -0,0 +1,193 @@
+"""Local charge session history for Andersen EV."""
+from __future__ import annotations
+from contextlib import contextmanager
+import logging
+import sqlite3
+
+from homeassistant.core import HomeAssistant
+
+from .konnect.exceptions import KonnectError
+from .const import HISTORY_PAGE_SIZE
+
+_LOGGER = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS charge_sessions (
+    uuid TEXT PRIMARY KEY,
+    device_id TEXT NOT NULL,
+    start TEXT NOT NULL,
+    duration INTEGER,
+    charge_energy REAL,
+    charge_cost REAL,
+    grid_energy REAL,
+    grid_cost REAL,
+    solar_energy REAL,
+    solar_cost REAL,
+    surplus_energy REAL,
+    surplus_cost REAL
+);
+CREATE INDEX IF NOT EXISTS charge_sessions_device_start ON charge_sessions (device_id, start);
+CREATE TABLE IF NOT EXISTS sync_state (
+    device_id TEXT PRIMARY KEY,
+    synced_until TEXT,
+    resume_from TEXT,
+    resume_offset INTEGER
+);
+"""
+
+# charge_sessions column -> deviceCalculatedChargeLogs field
+COLUMNS = {
+    "uuid": "uuid",
+    "device_id": "deviceId",
+    "start": "startDateTimeLocal",
+    "duration": "duration",
+    "charge_energy": "chargeEnergyTotal",
+    "charge_cost": "chargeCostTotal",
+    "grid_energy": "gridEnergyTotal",
+    "grid_cost": "gridCostTotal",
+    "solar_energy": "solarEnergyTotal",
+    "solar_cost": "solarCostTotal",
+    "surplus_energy": "surplusUsedEnergyTotal",
+    "surplus_cost": "surplusUsedCostTotal",
+}
+
+# Length of the startDateTimeLocal prefix that identifies each period
+PERIODS = {"day": 10, "month": 7, "year": 4}
+
+
+class AndersenEvChargeHistory:
+    """Charge sessions synced incrementally from the cloud into a local SQLite index.
+
+    The first sync pages through every session once. Later syncs only ask for
+    sessions since the watermark, the newest session stored when the last sync
+    finished. Sessions come newest first, so the watermark only moves once the
+    last page is in; a sync that stops early saves the page it got to and the
+    next one carries on from there. Sessions are keyed by uuid so the overlap
+    at the watermark, or a resumed page, is simply ignored.
+    """
+
+    def __init__(self, hass: HomeAssistant, path: str) -> None:
+        """Initialize the history store."""
+        self.hass = hass
+        self.path = path
+        self._initialized = False
+
+    @contextmanager
+    def _connect(self):
+        """Open a connection for one executor job, committing and closing it afterwards."""
+        conn = sqlite3.connect(self.path)
+        try:
+            if not self._initialized:
+                conn.executescript(SCHEMA)
+                self._initialized = True
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _sync_state(self, device_id: str) -> tuple[str | None, int]:
+        """Return the date_from and offset the next sync for a device starts at."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT synced_until, resume_from, resume_offset FROM sync_state WHERE device_id = ?",
+                (device_id,),
+            ).fetchone()
+        if row is None:
+            # Never finished a sync (or the index predates sync_state), so page through everything
+            return None, 0
+        synced_until, resume_from, resume_offset = row
+        if resume_offset is not None:
+            return resume_from, resume_offset
+        return synced_until, 0
+
+    def _insert(self, device_id: str, logs: list, date_from: str | None, next_offset: int | None) -> int:
+        """Store a page of sessions and, in the same transaction, how far the sync got.
+
+        next_offset is the offset of the next page, or None once the last page is in.
+        """
+        rows = []
+        for log in logs:
+            if not log.get("uuid") or not log.get("startDateTimeLocal"):
+                continue
+            row = {column: log.get(field) for column, field in COLUMNS.items()}
+            row["device_id"] = row["device_id"] or device_id
+            rows.append(row)
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                f"INSERT OR IGNORE INTO charge_sessions ({', '.join(COLUMNS)}) "
+                f"VALUES ({', '.join(':' + column for column in COLUMNS)})",
+                rows,
+            )
+            added = conn.total_changes - before
+            if next_offset is None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO sync_state (device_id, synced_until, resume_from, resume_offset) "
+                    "VALUES (?, (SELECT MAX(start) FROM charge_sessions WHERE device_id = ?), NULL, NULL)",
+                    (device_id, device_id),
+                )
+            else:
+                conn.execute(
+                    "INSERT INTO sync_state (device_id, resume_from, resume_offset) VALUES (?, ?, ?) "
+                    "ON CONFLICT(device_id) DO UPDATE SET resume_from = excluded.resume_from, "
+                    "resume_offset = excluded.resume_offset",
+                    (device_id, date_from, next_offset),
+                )
+            return added
+
+    def _totals(self, device_id: str, period: str, start: str | None, end: str | None) -> list[dict]:
+        prefix = PERIODS[period]
+        query = (
+            f"SELECT substr(start, 1, {prefix}) AS period, COUNT(*) AS sessions, "
+            "SUM(duration) AS duration, SUM(charge_energy) AS charge_energy, SUM(charge_cost) AS charge_cost, "
+            "SUM(grid_energy) AS grid_energy, SUM(grid_cost) AS grid_cost, "
+            "SUM(solar_energy) AS solar_energy, SUM(solar_cost) AS solar_cost, "
+            "SUM(surplus_energy) AS surplus_energy, SUM(surplus_cost) AS surplus_cost "
+            "FROM charge_sessions WHERE device_id = ?"
+        )
+        params = [device_id]
+        if start:
+            query += " AND start >= ?"
+            params.append(start)
+        if end:
+            query += " AND start < ?"
+            params.append(end)
+        query += " GROUP BY period ORDER BY period"
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            return [dict(row) for row in conn.execute(query, params)]
+
+    async def async_sync(self, device) -> int:
+        """Fetch sessions newer than the watermark for a device; returns how many were added."""
+        watermark, offset = await self.hass.async_add_executor_job(self._sync_state, device.device_id)
+        if offset:
+            _LOGGER.debug(f"Resuming charge history sync for {device.friendly_name} at offset {offset}")
+        elif watermark is None:
+            _LOGGER.debug(f"Starting full charge history sync for {device.friendly_name}")
+
+        added = 0
+        while True:
+            try:
+                logs = await device.getChargeLogs(
+                    offset=offset, limit=HISTORY_PAGE_SIZE, date_from=watermark, min_energy=0
+                )
+            except KonnectError as err:
+                # The pages stored so far are recorded, the next sync carries on from the next one
+                _LOGGER.debug(f"Charge history sync for {device.friendly_name} stopped early: {err}")
+                break
+            last_page = len(logs) < HISTORY_PAGE_SIZE
+            added += await self.hass.async_add_executor_job(
+                self._insert, device.device_id, logs, watermark, None if last_page else offset + HISTORY_PAGE_SIZE
+            )
+            if last_page:
+                break
+            offset += HISTORY_PAGE_SIZE
+
+        if added:
+            _LOGGER.debug(f"Added {added} charge sessions to history for {device.friendly_name}")
+        return added
+
+    async def async_totals(self, device_id: str, period: str = "month",
+                           start: str | None = None, end: str | None = None) -> list[dict]:
+        """Return session totals per day, month or year from the local index."""
+        return await self.hass.async_add_executor_job(self._totals, device_id, period, start, end)
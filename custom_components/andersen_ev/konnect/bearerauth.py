@@ -1,8 +0,0 @@
-import requests
-
-class BearerAuth(requests.auth.AuthBase):
-    def __init__(self, token):
-        self.token = token
-    def __call__(self, r):
-        r.headers["Authorization"] = "Bearer " + self.token
-        return r
\ No newline at end of file
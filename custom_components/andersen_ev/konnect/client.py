@@ -2,13 +2,35 @@ import asyncio
 import json
 import time
 import logging
-import requests
+import aiohttp
 from . import const
+from . import query
 from .device import KonnectDevice
+from .exceptions import (
+    DeadlineExceeded,
+    KonnectAuthError,
+    KonnectGraphQLError,
+    KonnectRateLimitError,
+    KonnectSchemaError,
+    KonnectTransportError,
+)
+from .retry import CircuitBreaker, RetryPolicy, RETRYABLE_STATUS, parse_retry_after
+from .singleflight import SingleFlight
+from .transport import KonnectTransport
 from warrant.aws_srp import AWSSRP
 
 _LOGGER = logging.getLogger(__name__)
 
+BATCH_STATUS_RETRY = 3600  # seconds before a rejected batched status query is tried again
+
+
+def _cognito_error_code(err):
+    """Return the error code Cognito answered with (a botocore ClientError's), or None."""
+    response = getattr(err, 'response', None)
+    if not isinstance(response, dict):
+        return None
+    return (response.get('Error') or {}).get('Code')
+
 class KonnectClient:
     email = None
     username = None
@@ -20,58 +42,149 @@ class KonnectClient:
     tokenExpiryTime = None  # New field to track token expiration time
     refreshToken = None
 
-    def __init__(self, email, password):
+    def __init__(self, email, password, session=None):
         self.email = email
         self.password = password
+        # One pooled keep-alive session shared by every request this client makes
+        self.transport = KonnectTransport(session)
         self.token = None
         self.tokenType = None
         self.tokenExpiresIn = None
         self.tokenExpiryTime = None
-        self.refreshToken = None  # Keeping property for compatibility with storage
+        self.refreshToken = None
+        # Batched status queries are skipped until this time after the server refuses one
+        self._batch_status_retry_at = 0.0
+        # device_id -> KonnectDevice, reused across getDevices calls
+        self._devices = {}
+        # Ensures only one re-authentication runs at a time
+        self._auth_flight = SingleFlight()
+        # Shared by every API request so retries and outages are handled in one place
+        self.retry_policy = RetryPolicy()
+        self.breaker = CircuitBreaker()
 
     async def authenticate_user(self):
         """Authenticate with AWS Cognito using SRP."""
         # Before we can sign in, we need to determine the username. This is done
         # by making a request that for a given email, it will return the username
-        # (if it exists.)
-        self.username = await self.__fetchUsername()
+        # (if it exists.) The mapping never changes so a known username is reused.
+        if not self.username:
+            self.username = await self.__fetchUsername()
 
         try:
-            # Run the AWS SRP authentication in an executor to avoid blocking the event loop
-            aws_response = await asyncio.get_event_loop().run_in_executor(
-                None,
-                self.__authenticate_with_aws_srp
-            )
-
-            aws_result = aws_response['AuthenticationResult']
-            self.token = aws_result['IdToken']
-            self.tokenType = aws_result['TokenType']
-            self.tokenExpiresIn = aws_result['ExpiresIn']
-            # Calculate absolute expiry time (subtract 5 minutes for safety margin)
-            self.tokenExpiryTime = time.time() + aws_result['ExpiresIn'] - 90
-            self.refreshToken = aws_result['RefreshToken']  # Still store for future use if needed
+            try:
+                aws_response = await self.__runAwsSrp()
+            except Exception as e:
+                if _cognito_error_code(e) != 'UserNotFoundException':
+                    raise
+                # The cached username is no longer valid, look it up again and retry once
+                _LOGGER.debug("Cognito does not recognise cached username, looking it up again")
+                self.username = None
+                self.username = await self.__fetchUsername()
+                aws_response = await self.__runAwsSrp()
+
+            self.__applyAuthResult(aws_response['AuthenticationResult'])
             
-            _LOGGER.debug("Authentication successful, token will expire in %s seconds", aws_result['ExpiresIn'])
+            _LOGGER.debug("Authentication successful, token will expire in %s seconds", self.tokenExpiresIn)
             
+        except KonnectTransportError as e:
+            _LOGGER.warning("Authentication failed, Cognito unreachable: %s", str(e))
+            raise
+        except KonnectAuthError as e:
+            _LOGGER.error("Authentication failed: %s", str(e))
+            raise
         except Exception as e:
+            # botocore ClientErrors carry Cognito's verdict (wrong password, unknown
+            # user...); other botocore errors and OS errors mean we never got an
+            # answer. Anything else (e.g. warrant's challenge errors) is an auth problem.
+            if _cognito_error_code(e) is None and (
+                    isinstance(e, OSError) or type(e).__module__.startswith('botocore')):
+                _LOGGER.warning("Authentication failed, Cognito unreachable: %s", str(e))
+                raise KonnectTransportError(f'Failed to reach Cognito: {str(e)}') from e
             _LOGGER.error("Authentication failed: %s", str(e))
-            raise Exception(f'Failed to sign in: {str(e)}')
+            raise KonnectAuthError(f'Failed to sign in: {str(e)}') from e
+
+    async def __runAwsSrp(self):
+        # Run the AWS SRP authentication in an executor to avoid blocking the event loop
+        return await asyncio.get_event_loop().run_in_executor(
+            None,
+            self.__authenticate_with_aws_srp
+        )
 
     def __authenticate_with_aws_srp(self):
         # This is executed in the executor pool
         aws_srp = AWSSRP(
             username = self.username,
             password = self.password,
-            pool_id = 'eu-west-1_t5HV3bFjl',
-            pool_region = 'eu-west-1',
-            client_id = '23s0olnnniu5472ons0d9uoqt9')
+            pool_id = const.COGNITO_POOL_ID,
+            pool_region = const.COGNITO_REGION,
+            client_id = const.COGNITO_CLIENT_ID)
         return aws_srp.authenticate_user()
 
+    def __applyAuthResult(self, aws_result):
+        self.token = aws_result['IdToken']
+        self.tokenType = aws_result['TokenType']
+        self.tokenExpiresIn = aws_result['ExpiresIn']
+        # Calculate absolute expiry time (subtract 90 seconds for safety margin)
+        self.tokenExpiryTime = time.time() + aws_result['ExpiresIn'] - 90
+        # A refresh response doesn't include a new refresh token, keep the existing one
+        if aws_result.get('RefreshToken'):
+            self.refreshToken = aws_result['RefreshToken']
+
     async def refresh_token(self):
-        """Perform a full re-authentication instead of trying to use refresh tokens."""
-        _LOGGER.debug("Performing full re-authentication instead of token refresh")
-        await self.authenticate_user()
+        """Exchange the stored refresh token for new tokens, falling back to SRP login."""
+        if not self.refreshToken:
+            _LOGGER.debug("No refresh token available, performing full authentication")
+            await self.authenticate_user()
+            return
+
+        body = {
+            'AuthFlow': 'REFRESH_TOKEN_AUTH',
+            'ClientId': const.COGNITO_CLIENT_ID,
+            'AuthParameters': { 'REFRESH_TOKEN': self.refreshToken }
+        }
+        headers = {
+            'X-Amz-Target': 'AWSCognitoIdentityProviderService.InitiateAuth',
+            'Content-Type': 'application/x-amz-json-1.1'
+        }
+
+        response = await self.__post_unauthenticated(const.COGNITO_URL, json=body, headers=headers)
+
+        if response.status_code == 400:
+            # {'__type': 'NotAuthorizedException', 'message': 'Refresh Token has expired'}
+            try:
+                error_type = response.json().get('__type', '')
+            except ValueError:
+                error_type = ''
+            if 'NotAuthorizedException' in error_type:
+                _LOGGER.debug("Refresh token rejected, performing full authentication")
+                self.refreshToken = None
+                await self.authenticate_user()
+                return
+
+        if response.status_code >= 500:
+            raise KonnectTransportError(f'Token refresh failed. Status Code: {response.status_code}')
+        if response.status_code != 200:
+            raise KonnectAuthError(f'Token refresh failed. Status Code: {response.status_code}, Response: {response.text}')
+
+        self.__applyAuthResult(response.json()['AuthenticationResult'])
+        _LOGGER.debug("Token refreshed, new token will expire in %s seconds", self.tokenExpiresIn)
             
+    async def reauthenticate(self, rejected_token=None, full=False):
+        """Renew the token, sharing one re-authentication between concurrent callers.
+
+        rejected_token is the token a caller saw rejected; if it has already been
+        replaced by a valid one in the meantime there is nothing left to do.
+        Set full to force an SRP login rather than a token refresh.
+        """
+        if (rejected_token is not None and rejected_token != self.token
+                and not self._auth_flight.in_flight('auth') and await self.is_token_valid()):
+            _LOGGER.debug("Token already renewed by another request")
+            return
+
+        if self._auth_flight.in_flight('auth'):
+            _LOGGER.debug("Waiting for re-authentication already in progress")
+        await self._auth_flight.run('auth', self.authenticate_user if full else self.refresh_token)
+
     async def is_token_valid(self):
         """Check if the current token is still valid."""
         if not self.token:
@@ -83,31 +196,25 @@ class KonnectClient:
         # Check if token is expired
         return time.time() < self.tokenExpiryTime
 
-    async def getDevices(self):
-        """Get list of devices from the API."""
-        await self.ensure_valid_auth()
+    async def getDevices(self, deadline=None):
+        """Get list of devices from the API.
+
+        A device returned by an earlier call is updated in place and returned
+        again, rather than replaced with a new KonnectDevice.
+        """
         devices = []
 
         url = const.API_DEVICES_URL
         
-        # Run blocking requests call in an executor to avoid blocking the event loop
-        response = await asyncio.get_event_loop().run_in_executor(
-            None,
-            lambda: requests.get(url, headers={"Authorization": f"Bearer {self.token}"})
-        )
+        response = await self.request('GET', url, deadline=deadline)
 
         if response.status_code != 200:
-            if response.status_code == 401:
-                # Token expired during request, refresh and retry
-                _LOGGER.debug("Token expired during getDevices request, refreshing")
-                await self.refresh_token()
-                return await self.getDevices()
-                
-            _LOGGER.error('Failed to get devices. Status Code: %s, Response: %s',
-                        response.status_code, response.text)
-            return devices
+            raise KonnectSchemaError(f'Failed to get devices. Status Code: {response.status_code}, Response: {response.text}')
 
-        response_body = response.json()
+        try:
+            response_body = response.json()
+        except ValueError as err:
+            raise KonnectSchemaError(f'Device list is not valid JSON: {err}') from err
         
         if not response_body.get('devices'):
             _LOGGER.warning("No devices found in API response")
@@ -119,40 +226,206 @@ class KonnectClient:
         for device in response_body['devices']:
             # Use "Andersen" as default friendly name if not set or empty
             friendly_name = device.get('friendlyName') or "Andersen"
-            devices.append(KonnectDevice(
-                api = self,
-                device_id = device['id'],
-                friendly_name = friendly_name,
-                user_lock = device['userLock']))
+            known = self._devices.get(device['id'])
+            if known is None:
+                known = KonnectDevice(
+                    api = self,
+                    device_id = device['id'],
+                    friendly_name = friendly_name,
+                    user_lock = device['userLock'])
+            else:
+                # Update the existing object so its last status and model name are kept
+                known.friendly_name = friendly_name
+                known.user_lock = device['userLock']
+            devices.append(known)
 
+        self._devices = {device.device_id: device for device in devices}
         return devices
 
+    async def getDevicesStatus(self, devices, fields=None, deadline=None):
+        """Fetch detailed status for several devices in one aliased GraphQL request.
+
+        fields limits the deviceStatus selection (None fetches everything). Returns
+        the set of device ids whose status was updated, or None if the batch was
+        rejected and the caller should fall back to per-device requests. The
+        request is bounded by deadline if one is given.
+        """
+        if not devices or time.monotonic() < self._batch_status_retry_at:
+            return None
+
+        body = {
+            'operationName': 'getDevicesStatus',
+            'variables': { f'id{idx}': device.device_id for idx, device in enumerate(devices) },
+            'query': query.batch_status_query(len(devices), fields)
+        }
+
+        try:
+            data = await self.graphql(body, deadline, allow_partial=True)
+        except KonnectGraphQLError as err:
+            # Errors raised while resolving fields carry a path; the errors of a
+            # document the server refused outright (e.g. aliases or query size
+            # not allowed) don't. Only the latter is worth backing off from.
+            if all(isinstance(error, dict) and not error.get('path') for error in err.errors):
+                _LOGGER.info("Batched status query rejected, using per-device requests for the next %s seconds: %s",
+                             BATCH_STATUS_RETRY, err.errors)
+                self._batch_status_retry_at = time.monotonic() + BATCH_STATUS_RETRY
+            else:
+                _LOGGER.debug("Batched status query failed: %s", err.errors)
+            return None
+        except (KonnectSchemaError, KonnectTransportError) as err:
+            _LOGGER.debug("Batched status request failed: %r", err)
+            return None
+
+        updated = set()
+        for idx, device in enumerate(devices):
+            device_data = data.get(f'd{idx}')
+            if not device_data or not device_data.get('deviceStatus'):
+                continue
+            device._apply_status(device_data)
+            updated.add(device.device_id)
+
+        _LOGGER.debug("Batched status request updated %s of %s devices", len(updated), len(devices))
+        return updated
+
     async def __fetchUsername(self):
         url = const.GRAPHQL_USER_MAP_URL
         body = { 'email': self.email }
         
-        # Run blocking requests call in an executor to avoid blocking the event loop
-        response = await asyncio.get_event_loop().run_in_executor(
-            None,
-            lambda: requests.post(url, json=body)
-        )
+        response = await self.__post_unauthenticated(url, json=body)
 
+        if response.status_code >= 500:
+            raise KonnectTransportError(f'Username lookup failed. Status Code: {response.status_code}')
         if response.status_code != 200:
-            raise Exception('Incorrect email address')
+            raise KonnectAuthError('Incorrect email address')
 
         # {'error': 'Pending user with email "x" not found'}
         # {'username': 'xxxxxxxx-xxxx-xxxx-xxxx-xxxxxxxxxxxx:x'}
-        response_body = response.json()
+        try:
+            response_body = response.json()
+        except ValueError as err:
+            raise KonnectSchemaError(f'Username lookup returned invalid JSON: {err}') from err
         if ('username' not in response_body):
-            raise Exception('Incorrect email address')
+            raise KonnectAuthError('Incorrect email address')
 
         return response_body['username']
 
+    async def __post_unauthenticated(self, url, json=None, headers=None):
+        """POST to a sign-in endpoint, reporting network failures as KonnectTransportError."""
+        try:
+            return await self.transport.post(url, json=json, headers=headers)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            raise KonnectTransportError(f'Failed to reach {url}: {err!r}') from err
+
+    def auth_headers(self):
+        """Return the Authorization header for the current token."""
+        return {"Authorization": f"Bearer {self.token}"}
+
+    async def post_graphql(self, body, deadline=None):
+        """POST a GraphQL request body using the current token."""
+        return await self.request('POST', const.GRAPHQL_URL, json=body, deadline=deadline)
+
+    async def graphql(self, body, deadline=None, allow_partial=False):
+        """POST a GraphQL request body and return the response's data.
+
+        Raises KonnectGraphQLError if the server answered with errors (unless
+        allow_partial is set and some data came back too) and KonnectSchemaError
+        if the response isn't a GraphQL result at all.
+        """
+        operation = body.get('operationName')
+        response = await self.post_graphql(body, deadline)
+
+        try:
+            response_body = response.json()
+        except ValueError as err:
+            raise KonnectSchemaError(
+                f'{operation} returned invalid JSON. Status Code: {response.status_code}') from err
+        if not isinstance(response_body, dict):
+            raise KonnectSchemaError(f'{operation} returned an unexpected response: {response_body!r}')
+
+        data = response_body.get('data')
+        errors = response_body.get('errors')
+        if errors and not (allow_partial and data):
+            raise KonnectGraphQLError(f'{operation} failed: {errors}', errors)
+        if response.status_code != 200 or not isinstance(data, dict):
+            raise KonnectSchemaError(
+                f'{operation} failed. Status Code: {response.status_code}, Response: {response.text}')
+        if errors:
+            _LOGGER.debug("Partial errors in %s response: %s", operation, errors)
+        return data
+
+    async def request(self, method, url, json=None, deadline=None):
+        """Send an authenticated API request under the shared retry policy and circuit breaker.
+
+        A rejected token is renewed once and the request repeated. Transport
+        errors and retryable statuses (429, 5xx) are retried up to the policy's
+        attempt limit after a backoff, or the server's Retry-After, as long as
+        the wait fits in what's left of deadline. Once retries run out this
+        raises KonnectRateLimitError for a 429 and KonnectTransportError for a
+        5xx or network failure; a token rejected twice (or a 403) raises
+        KonnectAuthError. Anything else is returned to the caller as is.
+        Raises CircuitOpenError while the cloud is failing, and DeadlineExceeded,
+        without counting it as a failure, when deadline cuts a request off.
+        """
+        attempt = 0
+        reauthenticated = False
+        while True:
+            await self.ensure_valid_auth()
+            token = self.token
+            self.breaker.acquire()
+            error = response = None
+            try:
+                response = await self.transport.request(
+                    method, url, json=json, headers=self.auth_headers(), deadline=deadline)
+            except DeadlineExceeded:
+                # Not the cloud's fault, the caller's time was up before sending
+                self.breaker.release()
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+                if isinstance(err, asyncio.TimeoutError) and deadline is not None and deadline.expired:
+                    # Cut off by the caller's deadline, not a sign the cloud is failing
+                    self.breaker.release()
+                    raise DeadlineExceeded(f'Deadline exceeded waiting for {url}') from err
+                self.breaker.record_failure()
+                error = err
+            except BaseException:
+                self.breaker.release()
+                raise
+            else:
+                if response.status_code not in RETRYABLE_STATUS:
+                    self.breaker.record_success()
+                    if response.status_code == 401 and not reauthenticated:
+                        _LOGGER.debug("Token rejected by %s, re-authenticating", url)
+                        await self.reauthenticate(token)
+                        reauthenticated = True
+                        continue
+                    if response.status_code in (401, 403):
+                        raise KonnectAuthError(f'Request to {url} not authorised. Status Code: {response.status_code}')
+                    return response
+                self.breaker.record_failure()
+
+            attempt += 1
+            delay = self.retry_policy.delay(attempt - 1, response)
+            if attempt >= self.retry_policy.attempts or (deadline is not None and delay >= deadline.remaining):
+                if error is not None:
+                    raise KonnectTransportError(f'Request to {url} failed: {error!r}') from error
+                if response.status_code == 429:
+                    raise KonnectRateLimitError(
+                        f'Request to {url} rate limited',
+                        parse_retry_after(response.headers.get('Retry-After')))
+                raise KonnectTransportError(f'Request to {url} failed. Status Code: {response.status_code}')
+            _LOGGER.debug("Request to %s failed (%s), retrying in %.1f seconds",
+                          url, response.status_code if response is not None else repr(error), delay)
+            await asyncio.sleep(delay)
+
+    async def close(self):
+        """Release the pooled HTTP session."""
+        await self.transport.close()
+
     async def ensure_valid_auth(self):
         """Ensure we have a valid authentication token."""
         if not await self.is_token_valid():
             _LOGGER.debug("Token invalid or expired, refreshing")
-            await self.refresh_token()
+            await self.reauthenticate()
         else:
             _LOGGER.debug("Token still valid, expiry in %s seconds", 
                          int(self.tokenExpiryTime - time.time()) if self.tokenExpiryTime else "unknown")
\ No newline at end of file
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import time
+from .exceptions import CommandSuperseded
+
+_LOGGER = logging.getLogger(__name__)
+
+# Weight of the newest command in the running average latency
+LATENCY_SMOOTHING = 0.2
+
+
+class CommandQueue:
+    """Run one device's mutations one at a time, in the order they were asked for.
+
+    Commands are queued under a key naming what they change (e.g. 'lock' for
+    both userLock and userUnlock). A command submitted while another with the
+    same key is still waiting replaces it and moves to the back of the queue,
+    so lock, unlock, lock arriving together sends a single lock. Callers of a
+    replaced command get CommandSuperseded. A key of None is never collapsed.
+    on_change is called whenever the depth or latency figures change.
+    """
+
+    def __init__(self, name, on_change=None):
+        self.name = name
+        self.on_change = on_change
+        self._pending = {}
+        self._sequence = 0
+        self._worker = None
+        self._running = False
+        self.last_latency = None
+        self.average_latency = None
+        self.processed = 0
+        self.superseded = 0
+
+    @property
+    def depth(self):
+        """Commands waiting or running."""
+        return len(self._pending) + (1 if self._running else 0)
+
+    def submit(self, key, factory):
+        """Queue a command and return a future for its result."""
+        future = asyncio.get_running_loop().create_future()
+        if key is None:
+            self._sequence += 1
+            key = (None, self._sequence)
+        else:
+            replaced = self._pending.pop(key, None)
+            if replaced is not None:
+                self.superseded += 1
+                _LOGGER.debug(f"{self.name}: '{key}' command superseded before it was sent")
+                if not replaced[1].done():
+                    replaced[1].set_exception(CommandSuperseded(key))
+                    # Nobody may be waiting on it any more
+                    replaced[1].exception()
+        self._pending[key] = (factory, future, time.monotonic())
+
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.ensure_future(self._run())
+        self._changed()
+        return future
+
+    async def run(self, key, factory):
+        """Queue a command and wait for its result."""
+        return await self.submit(key, factory)
+
+    async def _run(self):
+        while self._pending:
+            key = next(iter(self._pending))
+            factory, future, queued_at = self._pending.pop(key)
+            self._running = True
+            try:
+                result = await factory()
+            except Exception as err:
+                if not future.done():
+                    future.set_exception(err)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                self._running = False
+
+            latency = time.monotonic() - queued_at
+            self.last_latency = latency
+            if self.average_latency is None:
+                self.average_latency = latency
+            else:
+                self.average_latency += LATENCY_SMOOTHING * (latency - self.average_latency)
+            self.processed += 1
+            self._changed()
+
+    def stats(self):
+        return {
+            'depth': self.depth,
+            'last_latency': self.last_latency,
+            'average_latency': self.average_latency,
+            'processed': self.processed,
+            'superseded': self.superseded,
+        }
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change()
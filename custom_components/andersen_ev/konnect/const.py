@@ -5,6 +5,16 @@ GRAPHQL_USER_MAP_URL = 'https://graphql.andersen-ev.com/get-pending-user'
 
 API_DEVICES_URL = 'https://mobile.andersen-ev.com/api/getDevices'
 
+# AWS Cognito user pool used by the Konnect app
+COGNITO_REGION = 'eu-west-1'
+COGNITO_POOL_ID = 'eu-west-1_t5HV3bFjl'
+COGNITO_CLIENT_ID = '23s0olnnniu5472ons0d9uoqt9'
+COGNITO_URL = f'https://cognito-idp.{COGNITO_REGION}.amazonaws.com/'
+
+# GraphQL subscriptions are served over a websocket using the graphql-transport-ws protocol
+GRAPHQL_WS_URL = 'wss://graphql.andersen-ev.com/graphql'
+GRAPHQL_WS_PROTOCOL = 'graphql-transport-ws'
+
 GRAPHQL_RUN_COMMAND_QUERY = '''
 mutation runAEVCommand($deviceId: ID!, $functionName: String!, $params: String) {
   runAEVCommand(deviceId: $deviceId, functionName: $functionName, params: $params) {
@@ -14,6 +24,64 @@ mutation runAEVCommand($deviceId: ID!, $functionName: String!, $params: String)
 }
 '''
 
+GRAPHQL_DEVICE_STATUS_SUBSCRIPTION = '''
+subscription deviceStatusUpdated($id: ID!) {
+  deviceStatusUpdated(id: $id) {
+    id
+    sysFwVersion
+    evseState
+    online
+    sysRssi
+    sysSSID
+    lastEvent
+    lastEventAge
+    sysTime
+    sysSch0
+    sysSch1
+    sysSch2
+    sysSch3
+    sysSch4
+    sysFaultCode
+    sysChargingEnabled
+    cfgPENEarthConnected
+    cfgChargeAmpMax
+    cfgChargeAmpMin
+    cfgDSTActive
+    sysSchEnabled
+    sysUserLock
+    sysScheduleLock
+    sysSolarPower
+    sysGridPower
+    solarMaxGridChargePercent
+    solarChargeAlways
+    solarOverride
+    cfgCTConfig
+    chargeStatus {
+      start
+      chargeEnergyTotal
+      chargePower
+      duration
+    }
+    scheduleSlotsArray {
+      startHour
+      startMinute
+      endHour
+      endMinute
+      enabled
+      dayMap {
+        monday
+        tuesday
+        wednesday
+        thursday
+        friday
+        saturday
+        sunday
+      }
+    }
+  }
+}
+'''
+
 GRAPHQL_DEVICE_CHARGE_LOGS_QUERY = '''
 query getDeviceCalculatedChargeLogs($id: ID!, $limit: Int, $offset: Int, $minEnergy: Float, $dateFrom: Date) {
   getDevice(id: $id) {
@@ -44,6 +112,34 @@ query getDeviceCalculatedChargeLogs($id: ID!, $limit: Int, $offset: Int, $minEne
 }
 '''
 
+# deviceCalculatedPowerLogsBinned is an untyped JSON scalar, so it has no selection set
+GRAPHQL_POWER_LOGS_BINNED_QUERY = '''
+query getCalculatedPowerLogsBinned($id: ID!, $dateFrom: Date, $dateTo: Date, $binnedMinutes: Int, $limit: Int, $offset: Int) {
+  getDevice(id: $id) {
+    id
+    deviceCalculatedPowerLogsBinned(
+      dateFrom: $dateFrom
+      dateTo: $dateTo
+      binnedMinutes: $binnedMinutes
+      limit: $limit
+      offset: $offset
+    )
+    __typename
+  }
+}
+'''
+
+# ScheduleSlotsInput takes one schN key per slot being changed
+GRAPHQL_SET_SCHEDULES_MUTATION = '''
+mutation setSchedules($deviceId: ID!, $scheduleSlots: ScheduleSlotsInput!) {
+  setSchedules(deviceId: $deviceId, scheduleSlots: $scheduleSlots) {
+    id
+    name
+    return_value
+  }
+}
+'''
+
 GRAPHQL_DEVICE_STATUS_QUERY = '''
 query getDeviceStatusSimple($id: ID!) {
   getDevice(id: $id) {
@@ -175,9 +271,8 @@ query getDevice($id: ID!) {
 }
 '''
 
-GRAPHQL_DEVICE_STATUS_DETAILED_QUERY = '''
-query getDeviceStatus($id: ID!) {
-  getDevice(id: $id) {
+# Selection set shared by the single-device and batched detailed status queries
+GRAPHQL_DEVICE_STATUS_DETAILED_FIELDS = '''
     name
     deviceStatus {
       id
@@ -274,6 +369,10 @@ query getDeviceStatus($id: ID!) {
         }
       }
     }
-  }
+'''
+
+GRAPHQL_DEVICE_STATUS_DETAILED_QUERY = '''
+query getDeviceStatus($id: ID!) {
+  getDevice(id: $id) {''' + GRAPHQL_DEVICE_STATUS_DETAILED_FIELDS + '''  }
 }
-'''
\ No newline at end of file
+'''
@@ -0,0 +1,22 @@
+import time
+
+
+class Deadline:
+    """A fixed point in time that a group of requests must finish by.
+
+    Passed down explicitly from the caller that owns the budget (e.g. one
+    coordinator poll) so every request it makes shares the same end time.
+    """
+
+    __slots__ = ('expires_at',)
+
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds
+
+    @property
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self):
+        return time.monotonic() >= self.expires_at
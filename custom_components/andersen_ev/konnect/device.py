@@ -1,17 +1,27 @@
-import asyncio
-import requests
 import logging
 from . import const
-from .bearerauth import BearerAuth
+from . import query
+from .exceptions import KonnectSchemaError
+from .status import DeviceStatus
 
 _LOGGER = logging.getLogger(__name__)
 
+
+def _device_field(data, field, what):
+    """Return data's getDevice object, checking it carries field."""
+    device = data.get('getDevice')
+    if not isinstance(device, dict) or (field is not None and field not in device):
+        raise KonnectSchemaError(f"Invalid response format from {what} request")
+    return device
+
+
 class KonnectDevice:
     api = None
     device_id = None
     friendly_name = None
     user_lock = False
     _last_status = None
+    _status = None
     model_name = None  # Add this line for the model name
 
     def __init__(self, api, device_id, friendly_name, user_lock):
@@ -20,48 +30,47 @@ class KonnectDevice:
         self.friendly_name = friendly_name
         self.user_lock = user_lock
         self._last_status = None
+        self._status = None
         self.model_name = None  # Initialize model_name property
 
+    @property
+    def status(self):
+        """Typed snapshot of the last known status, parsed once per change."""
+        if self._status is None and self._last_status:
+            self._status = DeviceStatus.from_dict(self._last_status)
+        return self._status
+
+    def _invalidate_status(self):
+        """Drop the parsed snapshot after _last_status was modified in place."""
+        self._status = None
+
     async def reset_rcm(self):
         """Reset RCM fault on the device."""
         _LOGGER.debug(f"Attempting to reset RCM for device {self.device_id} ({self.friendly_name})")
-        success = await self.__runCommand('rcmReset')
-        if success:
-            _LOGGER.debug(f"Successfully reset RCM for device {self.device_id} ({self.friendly_name})")
-        else:
-            _LOGGER.warning(f"Failed to reset RCM for device {self.device_id} ({self.friendly_name})")
-        return success
+        await self.__runCommand('rcmReset')
+        _LOGGER.debug(f"Successfully reset RCM for device {self.device_id} ({self.friendly_name})")
+        return True
 
     async def enable(self):
         """Enable charging by unlocking user lock."""
         _LOGGER.debug(f"Attempting to enable charging for device {self.device_id} ({self.friendly_name})")
-        success = await self.__runCommand('userUnlock')
-        if success:
-            _LOGGER.debug(f"Successfully enabled charging for device {self.device_id} ({self.friendly_name})")
-            self.user_lock = True
-        else:
-            _LOGGER.warning(f"Failed to enable charging for device {self.device_id} ({self.friendly_name})")
-        return success
+        await self.__runCommand('userUnlock')
+        _LOGGER.debug(f"Successfully enabled charging for device {self.device_id} ({self.friendly_name})")
+        self.user_lock = True
+        return True
 
     async def disable(self):
         """Disable charging by locking user lock."""
         _LOGGER.debug(f"Attempting to disable charging for device {self.device_id} ({self.friendly_name})")
-        success = await self.__runCommand('userLock')
-        if success:
-            _LOGGER.debug(f"Successfully disabled charging for device {self.device_id} ({self.friendly_name})")
-            self.user_lock = False
-        else:
-            _LOGGER.warning(f"Failed to disable charging for device {self.device_id} ({self.friendly_name})")
-        return success
+        await self.__runCommand('userLock')
+        _LOGGER.debug(f"Successfully disabled charging for device {self.device_id} ({self.friendly_name})")
+        self.user_lock = False
+        return True
 
     async def disable_all_schedules(self):
         """Disable all charging schedules for the device."""
         _LOGGER.debug(f"Attempting to disable all schedules for device {self.device_id} ({self.friendly_name})")
         
-        # Ensure we have a valid token before making the request
-        await self.api.ensure_valid_auth()
-        
-        url = const.GRAPHQL_URL
         body = {
             'operationName': 'setAllSchedulesDisabled',
             'variables': { 'deviceId': self.device_id },
@@ -69,332 +78,201 @@ class KonnectDevice:
         }
 
         _LOGGER.debug(f"Sending API command to disable all schedules for device {self.device_id}")
-        
-        # Run blocking requests call in an executor to avoid blocking the event loop
-        try:
-            response = await asyncio.get_event_loop().run_in_executor(
-                None, 
-                lambda: requests.post(url, json=body, auth=BearerAuth(self.api.token))
-            )
-            
-            status_code = response.status_code
-            _LOGGER.debug(f"API command response status code: {status_code}")
-            
-            if status_code == 401:
-                # Token expired, re-authenticate and retry
-                _LOGGER.debug("Authentication token expired during command execution, re-authenticating")
-                await self.api.authenticate_user()
-                return await self.disable_all_schedules()
-                
-            if status_code == 200:
-                try:
-                    response_json = response.json()
-                    _LOGGER.debug(f"API disable all schedules response: {response_json}")
-                    
-                    # Check if there are errors in the GraphQL response
-                    if 'errors' in response_json:
-                        _LOGGER.warning(f"GraphQL errors in response: {response_json['errors']}")
-                        return False
-                        
-                    return True
-                except Exception as json_err:
-                    _LOGGER.warning(f"Error parsing JSON response: {json_err}")
-                    return False
-            else:
-                _LOGGER.warning(f"API command failed with status code {status_code}: {response.text}")
-                return False
-                
-        except Exception as err:
-            _LOGGER.error(f"Error executing disable all schedules: {err}")
-            return False
+        data = await self.api.graphql(body)
+        _LOGGER.debug(f"API disable all schedules response: {data}")
+        return True
+
+    async def setSchedules(self, schedule_slots):
+        """Write schedule slots, given as {index: slot}, in a single setSchedules mutation."""
+        body = {
+            'operationName': 'setSchedules',
+            'variables': {
+                'deviceId': self.device_id,
+                'scheduleSlots': {f'sch{index}': slot for index, slot in schedule_slots.items()}
+            },
+            'query': const.GRAPHQL_SET_SCHEDULES_MUTATION
+        }
+
+        _LOGGER.debug(f"Sending schedule update for device {self.friendly_name}, payload: {body['variables']}")
+        # The API answers {"data": {"setSchedules": null}} on success
+        data = await self.api.graphql(body)
+        _LOGGER.debug(f"API schedule update response: {data}")
+        return True
+
+    def _apply_schedule_slots(self, schedule_slots):
+        """Reflect written schedule slots, given as {index: slot}, in the last known status."""
+        if not self._last_status:
+            return
+        slots = list(self._last_status.get('scheduleSlotsArray') or [])
+        for index, slot in schedule_slots.items():
+            while len(slots) <= index:
+                slots.append({})
+            slots[index] = dict(slot)
+        # Replace rather than modify, parsed snapshots share the old dict
+        self._last_status = {**self._last_status, 'scheduleSlotsArray': slots}
+        self._invalidate_status()
 
     async def __runCommand(self, function):
-        """Run a command on the device with automatic token refresh."""
-        # Ensure we have a valid token before making the request
-        await self.api.ensure_valid_auth()
-        
-        url = const.GRAPHQL_URL
+        """Run a command on the device, raising a KonnectError if it was refused."""
         body = {
             'operationName': 'runAEVCommand',
             'variables': { 'deviceId': self.device_id, 'functionName': function },
             'query': const.GRAPHQL_RUN_COMMAND_QUERY
         }
 
-        _LOGGER.debug(f"Sending API command to {url}: {function} for device {self.device_id}")
-        
-        # Run blocking requests call in an executor to avoid blocking the event loop
-        try:
-            response = await asyncio.get_event_loop().run_in_executor(
-                None, 
-                lambda: requests.post(url, json=body, auth=BearerAuth(self.api.token))
-            )
-            
-            status_code = response.status_code
-            _LOGGER.debug(f"API command response status code: {status_code}")
-            
-            if status_code == 401:
-                # Token expired, re-authenticate and retry
-                _LOGGER.debug("Authentication token expired during command execution, re-authenticating")
-                await self.api.authenticate_user()
-                return await self.__runCommand(function)
-                
-            if status_code == 200:
-                try:
-                    response_json = response.json()
-                    _LOGGER.debug(f"API command response: {response_json}")
-                    
-                    # Check if there are errors in the GraphQL response
-                    if 'errors' in response_json:
-                        _LOGGER.warning(f"GraphQL errors in response: {response_json['errors']}")
-                        return False
-                        
-                    return True
-                except Exception as json_err:
-                    _LOGGER.warning(f"Error parsing JSON response: {json_err}")
-                    return False
-            else:
-                _LOGGER.warning(f"API command failed with status code {status_code}: {response.text}")
-                return False
-                
-        except Exception as err:
-            _LOGGER.error(f"Error executing API command {function}: {err}")
-            return False
+        _LOGGER.debug(f"Sending API command to {const.GRAPHQL_URL}: {function} for device {self.device_id}")
+        data = await self.api.graphql(body)
+        _LOGGER.debug(f"API command response: {data}")
+        return data
 
     async def getDeviceStatus(self):
         """Get the real-time status of the device."""
-        # Ensure we have a valid token before making the request
-        await self.api.ensure_valid_auth()
-        
-        url = const.GRAPHQL_URL
         body = {
             'operationName': 'getDeviceStatusSimple',
             'variables': { 'id': self.device_id },
             'query': const.GRAPHQL_DEVICE_STATUS_QUERY
         }
 
-        # Run blocking requests call in an executor to avoid blocking the event loop
-        try:
-            response = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: requests.post(url, json=body, auth=BearerAuth(self.api.token))
-            )
-            
-            if response.status_code == 401:
-                # Token expired, refresh and retry
-                _LOGGER.debug("Authentication token expired during status request, refreshing")
-                await self.api.refresh_token()
-                return await self.getDeviceStatus()
+        data = await self.api.graphql(body)
+        return self._apply_status(_device_field(data, 'deviceStatus', 'device status'))
+
+    def _apply_status(self, device_data):
+        """Store a getDevice payload as the device's last known status."""
+        # Store the model name if available (this is the "name" property from the API)
+        if device_data.get('name'):
+            self.model_name = device_data['name']
+            _LOGGER.debug(f"Model name for device {self.friendly_name}: {self.model_name}")
+        
+        # Store the last status for reference in the lock entity
+        status = device_data['deviceStatus']
+        
+        # Log changes to important status values
+        log_changes = False
+        if self._last_status and 'evseState' in status and 'evseState' in self._last_status:
+            if status['evseState'] != self._last_status['evseState']:
+                _LOGGER.info(f"Device {self.friendly_name}: EVSE state changed from {self._last_status['evseState']} to {status['evseState']}")
+                log_changes = True
                 
-            if response.status_code != 200:
-                _LOGGER.warning(f"Failed to get device status, status code: {response.status_code}")
-                return None
+        if self._last_status and 'online' in status and 'online' in self._last_status:
+            if status['online'] != self._last_status['online']:
+                _LOGGER.info(f"Device {self.friendly_name}: Online state changed from {self._last_status['online']} to {status['online']}")
+                log_changes = True
                 
-            response_body = response.json()
-            if 'data' not in response_body or 'getDevice' not in response_body['data'] or 'deviceStatus' not in response_body['data']['getDevice']:
-                _LOGGER.warning("Invalid response format from device status request")
-                return None
+        if log_changes:
+            _LOGGER.debug(f"Full status for {self.friendly_name}: {status}")
             
-            # Store the model name if available (this is the "name" property from the API)
-            if 'name' in response_body['data']['getDevice']:
-                self.model_name = response_body['data']['getDevice']['name']
-                _LOGGER.debug(f"Model name for device {self.friendly_name}: {self.model_name}")
-            
-            # Store the last status for reference in the lock entity
-            status = response_body['data']['getDevice']['deviceStatus']
-            
-            # Log changes to important status values
-            log_changes = False
-            if self._last_status and 'evseState' in status and 'evseState' in self._last_status:
-                if status['evseState'] != self._last_status['evseState']:
-                    _LOGGER.info(f"Device {self.friendly_name}: EVSE state changed from {self._last_status['evseState']} to {status['evseState']}")
-                    log_changes = True
-                    
-            if self._last_status and 'online' in status and 'online' in self._last_status:
-                if status['online'] != self._last_status['online']:
-                    _LOGGER.info(f"Device {self.friendly_name}: Online state changed from {self._last_status['online']} to {status['online']}")
-                    log_changes = True
-                    
-            if log_changes:
-                _LOGGER.debug(f"Full status for {self.friendly_name}: {status}")
-                
+        self._last_status = status
+        self._status = None
+        return status
+
+    def _merge_status(self, delta):
+        """Merge a partial deviceStatus push into the last known status.
+
+        Nested objects (e.g. chargeStatus) are merged key by key because pushes
+        only carry a subset of their fields. Returns True if anything changed.
+        The merge goes into a new dict, as parsed snapshots share the old one.
+        """
+        if not delta:
+            return False
+
+        status = dict(self._last_status or {})
+        changed = False
+        for key, value in delta.items():
+            if isinstance(value, dict) and isinstance(status.get(key), dict):
+                if any(status[key].get(sub_key) != sub_value for sub_key, sub_value in value.items()):
+                    status[key] = {**status[key], **value}
+                    changed = True
+            elif status.get(key) != value:
+                if key == 'evseState' and key in status:
+                    _LOGGER.info(f"Device {self.friendly_name}: EVSE state changed from {status[key]} to {value}")
+                elif key == 'online' and key in status:
+                    _LOGGER.info(f"Device {self.friendly_name}: Online state changed from {status[key]} to {value}")
+                status[key] = value
+                changed = True
+        if changed:
             self._last_status = status
-            return status
-            
-        except Exception as err:
-            _LOGGER.error(f"Error getting device status: {err}")
-            return None
+            self._status = None
+        return changed
 
-    async def getLastCharge(self):
+    async def getLastCharge(self, deadline=None):
         """Get the last charge session data."""
-        # Ensure we have a valid token before making the request
-        await self.api.ensure_valid_auth()
-        
-        url = const.GRAPHQL_URL
+        device_logs = await self.getChargeLogs(offset=0, limit=1, deadline=deadline)
+        if len(device_logs) == 0:
+            _LOGGER.debug(f"No charge logs available for device {self.friendly_name}")
+            return None
+
+        latest_log = device_logs[0]
+        return {
+            'duration': latest_log['duration'],
+            'chargeCostTotal': latest_log['chargeCostTotal'],
+            'chargeEnergyTotal': latest_log['chargeEnergyTotal'],
+            'gridCostTotal': latest_log['gridCostTotal'],
+            'gridEnergyTotal': latest_log['gridEnergyTotal'],
+            'solarEnergyTotal': latest_log['solarEnergyTotal'],
+            'solarCostTotal': latest_log['solarCostTotal'],
+            'surplusUsedCostTotal': latest_log['surplusUsedCostTotal'],
+            'surplusUsedEnergyTotal': latest_log['surplusUsedEnergyTotal']
+        }
+
+    async def getChargeLogs(self, offset=0, limit=1, date_from=None, min_energy=0.5, deadline=None):
+        """Get a page of calculated charge sessions, newest first."""
+        variables = { 'id': self.device_id, 'offset': offset, 'limit': limit, 'minEnergy': min_energy }
+        if date_from is not None:
+            variables['dateFrom'] = date_from
         body = {
             'operationName': 'getDeviceCalculatedChargeLogs',
-            'variables': { 'id': self.device_id, 'offset': 0, 'limit': 1, 'minEnergy': 0.5 },
+            'variables': variables,
             'query': const.GRAPHQL_DEVICE_CHARGE_LOGS_QUERY
         }
 
-        # Run blocking requests call in an executor to avoid blocking the event loop
-        try:
-            response = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: requests.post(url, json=body, auth=BearerAuth(self.api.token))
-            )
-            
-            if response.status_code == 401:
-                # Token expired, re-authenticate and retry
-                _LOGGER.debug("Authentication token expired during last charge request, re-authenticating")
-                await self.api.authenticate_user()
-                return await self.getLastCharge()
-            
-            if response.status_code != 200:
-                _LOGGER.warning(f"Failed to get last charge, status code: {response.status_code}")
-                return None
-                
-            response_body = response.json()
-            
-            if 'errors' in response_body:
-                _LOGGER.warning(f"GraphQL errors in charge logs response: {response_body['errors']}")
-                return None
-                
-            if ('data' not in response_body or 
-                'getDevice' not in response_body['data'] or 
-                'deviceCalculatedChargeLogs' not in response_body['data']['getDevice']):
-                _LOGGER.warning("Invalid response format from last charge request")
-                return None
-                
-            device_logs = response_body['data']['getDevice']['deviceCalculatedChargeLogs']
-            if len(device_logs) == 0:
-                _LOGGER.debug(f"No charge logs available for device {self.friendly_name}")
-                return None
-
-            latest_log = device_logs[0]
-            return {
-                'duration': latest_log['duration'],
-                'chargeCostTotal': latest_log['chargeCostTotal'],
-                'chargeEnergyTotal': latest_log['chargeEnergyTotal'],
-                'gridCostTotal': latest_log['gridCostTotal'],
-                'gridEnergyTotal': latest_log['gridEnergyTotal'],
-                'solarEnergyTotal': latest_log['solarEnergyTotal'],
-                'solarCostTotal': latest_log['solarCostTotal'],
-                'surplusUsedCostTotal': latest_log['surplusUsedCostTotal'],
-                'surplusUsedEnergyTotal': latest_log['surplusUsedEnergyTotal']
-            }
-            
-        except Exception as err:
-            _LOGGER.error(f"Error getting last charge data: {err}")
-            return None
+        data = await self.api.graphql(body, deadline)
+        return _device_field(data, 'deviceCalculatedChargeLogs', 'charge logs')['deviceCalculatedChargeLogs'] or []
+
+    async def getPowerLogsBinned(self, date_from, date_to, binned_minutes=60, offset=0, limit=200):
+        """Get a page of power logs aggregated into bins of binned_minutes."""
+        body = {
+            'operationName': 'getCalculatedPowerLogsBinned',
+            'variables': {
+                'id': self.device_id,
+                'dateFrom': date_from,
+                'dateTo': date_to,
+                'binnedMinutes': binned_minutes,
+                'offset': offset,
+                'limit': limit
+            },
+            'query': const.GRAPHQL_POWER_LOGS_BINNED_QUERY
+        }
+
+        data = await self.api.graphql(body)
+        return _device_field(data, 'deviceCalculatedPowerLogsBinned', 'power logs')['deviceCalculatedPowerLogsBinned'] or []
 
     async def getDeviceInfo(self):
         """Get the detailed device information."""
         _LOGGER.debug(f"Fetching detailed info for device {self.device_id} ({self.friendly_name})")
         
-        # Ensure we have a valid token before making the request
-        await self.api.ensure_valid_auth()
-        
-        url = const.GRAPHQL_URL
         body = {
             'operationName': 'getDevice',
             'variables': { 'id': self.device_id },
             'query': const.GRAPHQL_DEVICE_INFO_QUERY
         }
 
-        # Run blocking requests call in an executor to avoid blocking the event loop
-        try:
-            response = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: requests.post(url, json=body, auth=BearerAuth(self.api.token))
-            )
-            
-            if response.status_code == 401:
-                # Token expired, refresh and retry
-                _LOGGER.debug("Authentication token expired during device info request, refreshing")
-                await self.api.refresh_token()
-                return await self.getDeviceInfo()
-                
-            if response.status_code != 200:
-                _LOGGER.warning(f"Failed to get device info, status code: {response.status_code}")
-                return None
-                
-            response_body = response.json()
-            if 'data' not in response_body or 'getDevice' not in response_body['data']:
-                _LOGGER.warning("Invalid response format from device info request")
-                return None
-            
-            device_info = response_body['data']['getDevice']
-            _LOGGER.debug(f"Successfully retrieved device info for {self.friendly_name}")
-            
-            # Return a clean dictionary with the relevant device information
-            return device_info
-            
-        except Exception as err:
-            _LOGGER.error(f"Error getting device info: {err}")
-            return None
+        data = await self.api.graphql(body)
+        device_info = _device_field(data, None, 'device info')
+        _LOGGER.debug(f"Successfully retrieved device info for {self.friendly_name}")
+        return device_info
+
+    async def getDetailedDeviceStatus(self, fields=None, deadline=None):
+        """Get the detailed status of the device.
 
-    async def getDetailedDeviceStatus(self):
-        """Get the detailed status of the device."""
+        fields limits the deviceStatus selection; None fetches every field.
+        """
         _LOGGER.debug(f"Fetching detailed status for device {self.device_id} ({self.friendly_name})")
         
-        # Ensure we have a valid token before making the request
-        await self.api.ensure_valid_auth()
-        
-        url = const.GRAPHQL_URL
         body = {
             'operationName': 'getDeviceStatus',
             'variables': { 'id': self.device_id },
-            'query': const.GRAPHQL_DEVICE_STATUS_DETAILED_QUERY
+            'query': query.status_query(fields)
         }
 
-        # Run blocking requests call in an executor to avoid blocking the event loop
-        try:
-            response = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: requests.post(url, json=body, auth=BearerAuth(self.api.token))
-            )
-            
-            if response.status_code == 401:
-                # Token expired, refresh and retry
-                _LOGGER.debug("Authentication token expired during status request, refreshing")
-                await self.api.refresh_token()
-                return await self.getDeviceStatus()
-                
-            if response.status_code != 200:
-                _LOGGER.warning(f"Failed to get device status, status code: {response.status_code}")
-                return None
-                
-            response_body = response.json()
-            if 'data' not in response_body or 'getDevice' not in response_body['data'] or 'deviceStatus' not in response_body['data']['getDevice']:
-                _LOGGER.warning("Invalid response format from detailed device status request")
-                return None
-            
-            # Store the model name if available (this is the "name" property from the API)
-            if 'name' in response_body['data']['getDevice']:
-                self.model_name = response_body['data']['getDevice']['name']
-                _LOGGER.debug(f"Model name for device {self.friendly_name}: {self.model_name}")
-            
-            # Store the last status for reference in the lock entity
-            status = response_body['data']['getDevice']['deviceStatus']
-            
-            # Log changes to important status values
-            log_changes = False
-            if self._last_status and 'evseState' in status and 'evseState' in self._last_status:
-                if status['evseState'] != self._last_status['evseState']:
-                    _LOGGER.info(f"Device {self.friendly_name}: EVSE state changed from {self._last_status['evseState']} to {status['evseState']}")
-                    log_changes = True
-                    
-            if self._last_status and 'online' in status and 'online' in self._last_status:
-                if status['online'] != self._last_status['online']:
-                    _LOGGER.info(f"Device {self.friendly_name}: Online state changed from {self._last_status['online']} to {status['online']}")
-                    log_changes = True
-                    
-            if log_changes:
-                _LOGGER.debug(f"Full detailed status for {self.friendly_name}: {status}")
-                
-            self._last_status = status
-            return status
-            
-        except Exception as err:
-            _LOGGER.error(f"Error getting device status: {err}")
-            return None
+        data = await self.api.graphql(body, deadline)
+        return self._apply_status(_device_field(data, 'deviceStatus', 'detailed device status'))
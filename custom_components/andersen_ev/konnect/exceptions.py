@@ -0,0 +1,48 @@
+import asyncio
+
+
+class KonnectError(Exception):
+    """Base class for errors raised by the konnect package."""
+
+
+class KonnectAuthError(KonnectError):
+    """The credentials or token were rejected; signing in again may help."""
+
+
+class KonnectRateLimitError(KonnectError):
+    """The API asked us to slow down (HTTP 429)."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class KonnectTransportError(KonnectError):
+    """The API couldn't be reached or failed on its side (network, timeout, 5xx).
+
+    Signing in again won't help; waiting will.
+    """
+
+
+class DeadlineExceeded(KonnectTransportError, asyncio.TimeoutError):
+    """The time budget for a unit of work ran out before a request could be sent."""
+
+
+class CircuitOpenError(KonnectTransportError):
+    """Requests are being refused locally because the cloud keeps failing."""
+
+
+class KonnectGraphQLError(KonnectError):
+    """The GraphQL API answered with errors."""
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors or []
+
+
+class KonnectSchemaError(KonnectError):
+    """A response didn't have the shape the integration expects."""
+
+
+class CommandSuperseded(KonnectError):
+    """A queued command was replaced by a newer one with the same key before it ran."""
@@ -0,0 +1,96 @@
+import functools
+import re
+from . import const
+
+# Fields the integration itself relies on, whatever entities are enabled
+REQUIRED_STATUS_FIELDS = frozenset({
+    'id',
+    'online',
+    'evseState',
+    'sysUserLock',
+    'sysChargingEnabled',
+    'sysProductName',
+    'sysProductId',
+    'sysHwVersion',
+})
+
+
+def _split_selection(selection):
+    """Split a deviceStatus selection set into {top-level field: selection text}.
+
+    Nested selections (chargeStatus, scheduleSlotsArray) are kept whole.
+    """
+    body = selection[selection.index('deviceStatus {') + len('deviceStatus {'):]
+    fields = {}
+    depth = 0
+    current = None
+    for token in re.findall(r'[{}]|\w+', body):
+        if token == '{':
+            depth += 1
+            fields[current] += ' {'
+        elif token == '}':
+            if depth == 0:
+                break
+            depth -= 1
+            fields[current] += ' }'
+        elif depth == 0:
+            current = token
+            fields[current] = token
+        else:
+            fields[current] += f' {token}'
+    return fields
+
+
+# Every deviceStatus field the detailed query knows about. The detailed query
+# mirrors getDeviceStatus in schema/andersen_ev.graphql, so generated queries
+# can only ever ask for fields the API is known to accept.
+STATUS_FIELD_SELECTIONS = _split_selection(const.GRAPHQL_DEVICE_STATUS_DETAILED_FIELDS)
+
+
+def status_selection(fields=None):
+    """Return the getDevice selection set for the given deviceStatus fields.
+
+    None selects every known field. REQUIRED_STATUS_FIELDS are always included.
+    """
+    if fields is None:
+        return const.GRAPHQL_DEVICE_STATUS_DETAILED_FIELDS
+    return _build_selection(frozenset(fields) | REQUIRED_STATUS_FIELDS)
+
+
+@functools.lru_cache(maxsize=16)
+def _build_selection(fields):
+    unknown = fields - STATUS_FIELD_SELECTIONS.keys()
+    if unknown:
+        raise ValueError(f"Unknown deviceStatus fields: {', '.join(sorted(unknown))}")
+    # Keep the detailed query's field order so equal sets give identical documents
+    selections = '\n'.join(
+        f'      {selection}' for field, selection in STATUS_FIELD_SELECTIONS.items() if field in fields)
+    return f'\n    name\n    deviceStatus {{\n{selections}\n    }}\n'
+
+
+def status_query(fields=None):
+    """Return a single-device getDeviceStatus query for the given fields."""
+    if fields is None:
+        return const.GRAPHQL_DEVICE_STATUS_DETAILED_QUERY
+    return _build_query(frozenset(fields) | REQUIRED_STATUS_FIELDS)
+
+
+@functools.lru_cache(maxsize=16)
+def _build_query(fields):
+    return f'\nquery getDeviceStatus($id: ID!) {{\n  getDevice(id: $id) {{{_build_selection(fields)}  }}\n}}\n'
+
+
+def batch_status_query(count, fields=None):
+    """Return a query fetching `count` devices at once via aliased getDevice selections.
+
+    Device n is aliased dn and takes its id from the variable $idn.
+    """
+    return _build_batch_query(count, None if fields is None else frozenset(fields) | REQUIRED_STATUS_FIELDS)
+
+
+@functools.lru_cache(maxsize=16)
+def _build_batch_query(count, fields):
+    selection = const.GRAPHQL_DEVICE_STATUS_DETAILED_FIELDS if fields is None else _build_selection(fields)
+    variables = ', '.join(f'$id{idx}: ID!' for idx in range(count))
+    selections = ''.join(f'  d{idx}: getDevice(id: $id{idx}) {{{selection}  }}\n' for idx in range(count))
+    return f'query getDevicesStatus({variables}) {{\n{selections}}}\n'
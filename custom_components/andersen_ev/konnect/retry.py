@@ -0,0 +1,131 @@
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+import logging
+import random
+import time
+from .exceptions import CircuitOpenError
+
+_LOGGER = logging.getLogger(__name__)
+
+# HTTP statuses worth trying again after a pause
+RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+
+CIRCUIT_CLOSED = 'closed'
+CIRCUIT_OPEN = 'open'
+CIRCUIT_HALF_OPEN = 'half_open'
+
+
+class RetryPolicy:
+    """How often and how long to wait before retrying a failed request.
+
+    Waits use exponential backoff with full jitter, so many clients that fail
+    together don't all retry together. A server's Retry-After is honoured up
+    to max_retry_after seconds.
+    """
+
+    def __init__(self, attempts=3, base=0.5, max_delay=8.0, max_retry_after=60.0):
+        self.attempts = attempts
+        self.base = base
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+    def backoff(self, attempt):
+        """Seconds to wait after the given (0-based) failed attempt."""
+        return random.uniform(0, min(self.max_delay, self.base * 2 ** attempt))
+
+    def delay(self, attempt, response=None):
+        """Seconds to wait before the next attempt, preferring the server's Retry-After."""
+        retry_after = parse_retry_after(response.headers.get('Retry-After')) if response is not None else None
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        return self.backoff(attempt)
+
+
+def parse_retry_after(value):
+    """Parse a Retry-After header given either in seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class CircuitBreaker:
+    """Stop sending requests to a failing cloud and let them back in gradually.
+
+    After `threshold` failures in a row the circuit opens and every request is
+    refused for `cooldown` seconds. Then it goes half-open: one request at a
+    time is let through as a probe, and `recovery` successes in a row close it
+    again. A failure while half-open reopens it with the cooldown doubled, up
+    to max_cooldown.
+    """
+
+    def __init__(self, threshold=5, cooldown=30.0, max_cooldown=300.0, recovery=3):
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.recovery = recovery
+        self.state = CIRCUIT_CLOSED
+        self._failures = 0
+        self._successes = 0
+        self._cooldown = cooldown
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def retry_in(self):
+        """Seconds until an open circuit lets a probe through."""
+        if self.state != CIRCUIT_OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self._cooldown - time.monotonic())
+
+    def acquire(self):
+        """Claim permission to send a request, raising CircuitOpenError if there is none."""
+        if self.state == CIRCUIT_OPEN:
+            if self.retry_in > 0:
+                raise CircuitOpenError(f"Konnect API circuit open, retrying in {self.retry_in:.0f} seconds")
+            _LOGGER.debug("Konnect API circuit half-open, probing")
+            self.state = CIRCUIT_HALF_OPEN
+            self._successes = 0
+        if self.state == CIRCUIT_HALF_OPEN:
+            if self._probing:
+                raise CircuitOpenError("Konnect API circuit half-open, waiting for probe")
+            self._probing = True
+
+    def record_success(self):
+        self._failures = 0
+        if self.state == CIRCUIT_HALF_OPEN:
+            self._probing = False
+            self._successes += 1
+            if self._successes >= self.recovery:
+                _LOGGER.info("Konnect API recovered, circuit closed")
+                self.state = CIRCUIT_CLOSED
+                self._cooldown = self.base_cooldown
+
+    def record_failure(self):
+        if self.state == CIRCUIT_HALF_OPEN:
+            self._probing = False
+            self._cooldown = min(self._cooldown * 2, self.max_cooldown)
+            self._open()
+            return
+        self._failures += 1
+        if self.state == CIRCUIT_CLOSED and self._failures >= self.threshold:
+            self._open()
+
+    def release(self):
+        """Give back a half-open probe slot that ended without a verdict."""
+        self._probing = False
+
+    def _open(self):
+        _LOGGER.warning(f"Konnect API failing, pausing requests for {self._cooldown:.0f} seconds")
+        self.state = CIRCUIT_OPEN
+        self._opened_at = time.monotonic()
+        self._failures = 0
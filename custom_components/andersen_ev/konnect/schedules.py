@@ -0,0 +1,50 @@
+import asyncio
+import logging
+from .exceptions import KonnectError
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class ScheduleWriter:
+    """Gather schedule slot changes for one device into a single setSchedules mutation.
+
+    The first change opens a short window; every change made before it closes
+    joins the same mutation, with later changes to a slot replacing earlier
+    ones. All callers get the mutation's result. If a CommandQueue is given the
+    mutation is sent through it, in turn with the device's other commands.
+    """
+
+    def __init__(self, device, window, queue=None):
+        self.device = device
+        self.window = window
+        self.queue = queue
+        self._pending = {}
+        self._flush = None
+
+    @property
+    def window_open(self):
+        """Whether a change made now joins a mutation that hasn't been sent yet."""
+        return self._flush is not None
+
+    async def write(self, schedule_slots):
+        """Queue slots, given as {index: slot}, and wait for the mutation carrying them."""
+        self._pending.update(schedule_slots)
+        if self._flush is None:
+            self._flush = asyncio.ensure_future(self._write_after_window())
+        return await asyncio.shield(self._flush)
+
+    async def _write_after_window(self):
+        await asyncio.sleep(self.window)
+        schedule_slots, self._pending = self._pending, {}
+        # Changes arriving from here on open the next window
+        self._flush = None
+
+        _LOGGER.debug(f"Writing {len(schedule_slots)} schedule slot(s) for {self.device.friendly_name}")
+        device = self.device
+        try:
+            if self.queue is not None:
+                return await self.queue.run(None, lambda: device.setSchedules(schedule_slots))
+            return await device.setSchedules(schedule_slots)
+        except KonnectError as err:
+            _LOGGER.warning(f"Failed to update schedules for {device.friendly_name}: {err}")
+            raise
@@ -0,0 +1,38 @@
+import asyncio
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one in-flight task.
+
+    The first caller for a key starts the work; everyone who arrives while it
+    is still running awaits the same task and gets the same result (or the
+    same exception). A caller being cancelled does not cancel the shared work.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+
+    def in_flight(self, key):
+        return key in self._inflight
+
+    async def run(self, key, factory):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task)
+
+    async def cancel(self):
+        """Cancel every in-flight task and wait for them to finish."""
+        tasks = list(self._inflight.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _finished(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved in case every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
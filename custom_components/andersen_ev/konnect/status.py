@@ -0,0 +1,179 @@
+from dataclasses import dataclass
+from datetime import datetime
+from types import MappingProxyType
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+EVSE_STATE_READY = 1
+EVSE_STATE_CONNECTED = 2
+EVSE_STATE_CHARGING = 3
+EVSE_STATE_ERROR = 4
+EVSE_STATE_SLEEPING = 254
+EVSE_STATE_DISABLED = 255
+
+DAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+# chargeStatus API field -> ChargeStatus attribute
+CHARGE_STATUS_FIELDS = {
+    'start': 'start',
+    'chargeEnergyTotal': 'charge_energy_total',
+    'solarEnergyTotal': 'solar_energy_total',
+    'gridEnergyTotal': 'grid_energy_total',
+    'chargePower': 'charge_power',
+    'chargePowerMax': 'charge_power_max',
+    'solarPower': 'solar_power',
+    'gridPower': 'grid_power',
+    'duration': 'duration',
+}
+
+
+def parse_timestamp(value):
+    """Parse an ISO 8601 timestamp from the API, returning None if it isn't one."""
+    if not isinstance(value, str) or not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        _LOGGER.debug(f"Error parsing timestamp: {value}")
+        return None
+
+
+def parse_int(value):
+    """Normalise numeric values the API sometimes sends as strings."""
+    if value is None or isinstance(value, int):
+        return value
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass(frozen=True, slots=True)
+class ScheduleSlot:
+    """One charging schedule slot."""
+
+    start_hour: int
+    start_minute: int
+    end_hour: int
+    end_minute: int
+    enabled: bool
+    days: tuple
+
+    @classmethod
+    def from_dict(cls, slot):
+        day_map = slot.get('dayMap') or {}
+        return cls(
+            start_hour=parse_int(slot.get('startHour')),
+            start_minute=parse_int(slot.get('startMinute')),
+            end_hour=parse_int(slot.get('endHour')),
+            end_minute=parse_int(slot.get('endMinute')),
+            enabled=bool(slot.get('enabled')),
+            days=tuple(day for day in DAYS if day_map.get(day)))
+
+
+@dataclass(frozen=True, slots=True)
+class ChargeStatus:
+    """The current (or last) charging session as reported in deviceStatus."""
+
+    start: datetime
+    charge_energy_total: float
+    solar_energy_total: float
+    grid_energy_total: float
+    charge_power: float
+    charge_power_max: float
+    solar_power: float
+    grid_power: float
+    duration: int
+
+    @classmethod
+    def from_dict(cls, charge_status):
+        values = {attr: charge_status.get(key) for key, attr in CHARGE_STATUS_FIELDS.items()}
+        values['start'] = parse_timestamp(values['start'])
+        return cls(**values)
+
+    def get(self, key):
+        """Return a value by its API field name."""
+        attr = CHARGE_STATUS_FIELDS.get(key)
+        return getattr(self, attr) if attr else None
+
+
+@dataclass(frozen=True, slots=True)
+class DeviceStatus:
+    """Immutable snapshot of a deviceStatus response, parsed once when received.
+
+    Commonly used values are normalised into typed attributes. Everything
+    else is read by API name through fields, a read-only view of the response
+    rather than a copy. This relies on KonnectDevice replacing _last_status
+    instead of modifying it in place.
+    """
+
+    evse_state: int
+    online: bool
+    user_lock: bool
+    schedule_lock: bool
+    charging_enabled: bool
+    product_name: str
+    product_id: str
+    hw_version: str
+    charge_status: ChargeStatus
+    schedule_slots: tuple
+    fields: MappingProxyType
+
+    @classmethod
+    def from_dict(cls, status):
+        charge_status = status.get('chargeStatus')
+        slots = status.get('scheduleSlotsArray') or ()
+        return cls(
+            evse_state=parse_int(status.get('evseState')),
+            online=status.get('online'),
+            user_lock=status.get('sysUserLock'),
+            schedule_lock=status.get('sysScheduleLock'),
+            charging_enabled=status.get('sysChargingEnabled'),
+            product_name=status.get('sysProductName'),
+            product_id=status.get('sysProductId'),
+            hw_version=status.get('sysHwVersion'),
+            charge_status=ChargeStatus.from_dict(charge_status) if charge_status else None,
+            schedule_slots=tuple(ScheduleSlot.from_dict(slot or {}) for slot in slots),
+            fields=MappingProxyType(status))
+
+    def get(self, key, default=None):
+        """Return a field by its API name."""
+        return self.fields.get(key, default)
+
+    def __contains__(self, key):
+        return key in self.fields
+
+    def diff(self, other):
+        """Return the API keys whose values differ from another snapshot.
+
+        Changes inside chargeStatus are reported both as 'chargeStatus' and as
+        'chargeStatus.<field>', so readers of a single value can ignore the rest.
+        """
+        changed = {key for key in self.fields.keys() | other.fields.keys()
+                   if self.fields.get(key) != other.fields.get(key)}
+        if self.charge_status != other.charge_status:
+            changed.add('chargeStatus')
+            for key in CHARGE_STATUS_FIELDS:
+                before = other.charge_status.get(key) if other.charge_status else None
+                after = self.charge_status.get(key) if self.charge_status else None
+                if before != after:
+                    changed.add(f'chargeStatus.{key}')
+        if self.schedule_slots != other.schedule_slots:
+            changed.add('scheduleSlotsArray')
+        return frozenset(changed)
+
+    @property
+    def is_charging(self):
+        return self.evse_state == EVSE_STATE_CHARGING
+
+    @property
+    def model(self):
+        """Best available model description from the status fields."""
+        if self.product_name:
+            return self.product_name
+        if self.product_id:
+            return self.product_id
+        if self.hw_version:
+            return f"A2 (HW: {self.hw_version})"
+        return None
@@ -0,0 +1,186 @@
+import asyncio
+import json
+import logging
+import random
+import time
+import aiohttp
+from . import const
+from .exceptions import KonnectError
+
+_LOGGER = logging.getLogger(__name__)
+
+ACK_TIMEOUT = 15  # seconds to wait for connection_ack after connection_init
+HEARTBEAT = 30  # websocket ping interval, detects half-open connections
+BACKOFF_INITIAL = 2  # seconds
+BACKOFF_MAX = 300  # seconds
+STABLE_AFTER = 60  # seconds connected before the backoff is reset
+
+
+class SubscriptionError(KonnectError):
+    """Raised when the subscription server rejects the connection."""
+
+
+class KonnectSubscription:
+    """Streams deviceStatusUpdated pushes for a set of devices over one websocket.
+
+    Pushed deltas are merged into each KonnectDevice's _last_status and then
+    reported through on_update(device). The subscription only counts as healthy
+    once every device's stream has delivered a push on the current socket, as
+    the server can accept the connection and still reject a subscription.
+    on_health(healthy) is called whenever that changes, so the caller can adjust
+    its polling. The connection is re-established with exponential backoff
+    until stop().
+    """
+
+    def __init__(self, api, on_update, on_health=None):
+        self.api = api
+        self._on_update = on_update
+        self._on_health = on_health
+        self._devices = {}
+        self._task = None
+        self._ws = None
+        self._healthy = False
+        self._connected_since = None
+        # Devices whose stream has delivered a push on the current socket
+        self._live = set()
+
+    @property
+    def healthy(self):
+        """Whether every device's stream has delivered a push on the current socket."""
+        return self._healthy
+
+    def start(self, devices):
+        """Start streaming updates for the given devices."""
+        self._devices = {device.device_id: device for device in devices}
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def set_devices(self, devices):
+        """Update the device set, resubscribing if it changed."""
+        devices = {device.device_id: device for device in devices}
+        changed = devices.keys() != self._devices.keys()
+        # Always keep the latest objects so merges land on the live instances
+        self._devices = devices
+        self._live &= devices.keys()
+        self._update_health()
+        if changed and self._ws is not None and not self._ws.closed:
+            _LOGGER.debug("Device list changed, resubscribing")
+            asyncio.get_running_loop().create_task(self._ws.close())
+
+    async def stop(self):
+        """Close the socket and stop reconnecting."""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._connected_since = None
+        self._live.clear()
+        self._set_healthy(False)
+
+    def _update_health(self):
+        self._set_healthy(bool(self._devices) and self._live >= self._devices.keys())
+
+    def _set_healthy(self, healthy):
+        if healthy == self._healthy:
+            return
+        self._healthy = healthy
+        _LOGGER.debug("Live status subscription %s", "delivering for every device" if healthy else "not delivering")
+        if self._on_health is not None:
+            self._on_health(healthy)
+
+    async def _run(self):
+        backoff = BACKOFF_INITIAL
+        while True:
+            try:
+                await self._listen()
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                _LOGGER.debug("Live status subscription error: %s", err)
+
+            connected_since, self._connected_since = self._connected_since, None
+            self._live.clear()
+            self._set_healthy(False)
+            if connected_since is not None and time.monotonic() - connected_since >= STABLE_AFTER:
+                # The connection held up for a while, so start the backoff again from the bottom
+                backoff = BACKOFF_INITIAL
+
+            delay = backoff * random.uniform(0.8, 1.2)
+            _LOGGER.debug("Reconnecting live status subscription in %.0f seconds", delay)
+            await asyncio.sleep(delay)
+            backoff = min(backoff * 2, BACKOFF_MAX)
+
+    async def _listen(self):
+        if not self._devices:
+            return
+
+        await self.api.ensure_valid_auth()
+
+        async with self.api.transport.ws_connect(
+                const.GRAPHQL_WS_URL,
+                protocols=(const.GRAPHQL_WS_PROTOCOL,),
+                heartbeat=HEARTBEAT) as ws:
+            self._ws = ws
+            try:
+                await ws.send_json({
+                    'type': 'connection_init',
+                    'payload': {'Authorization': f'Bearer {self.api.token}'}
+                })
+                ack = await ws.receive_json(timeout=ACK_TIMEOUT)
+                if ack.get('type') != 'connection_ack':
+                    raise SubscriptionError(f"Unexpected handshake response: {ack}")
+
+                for device_id in list(self._devices):
+                    await ws.send_json({
+                        'id': device_id,
+                        'type': 'subscribe',
+                        'payload': {
+                            'operationName': 'deviceStatusUpdated',
+                            'variables': {'id': device_id},
+                            'query': const.GRAPHQL_DEVICE_STATUS_SUBSCRIPTION
+                        }
+                    })
+
+                self._connected_since = time.monotonic()
+
+                async for msg in ws:
+                    if msg.type != aiohttp.WSMsgType.TEXT:
+                        if msg.type == aiohttp.WSMsgType.ERROR:
+                            raise SubscriptionError(f"Websocket error: {ws.exception()}")
+                        continue
+                    await self._handle_message(ws, json.loads(msg.data))
+            finally:
+                self._ws = None
+
+    async def _handle_message(self, ws, message):
+        msg_type = message.get('type')
+
+        if msg_type == 'next':
+            device = self._devices.get(message.get('id'))
+            payload = message.get('payload') or {}
+            if payload.get('errors'):
+                _LOGGER.debug("Subscription errors for %s: %s", message.get('id'), payload['errors'])
+            delta = (payload.get('data') or {}).get('deviceStatusUpdated')
+            if device is not None and delta:
+                # The stream is known to work from its first push on
+                self._live.add(device.device_id)
+                if device._merge_status(delta):
+                    self._on_update(device)
+                self._update_health()
+        elif msg_type == 'ping':
+            await ws.send_json({'type': 'pong'})
+        elif msg_type == 'error':
+            _LOGGER.warning("Live status subscription rejected for %s: %s",
+                            message.get('id'), message.get('payload'))
+            # Nothing will be pushed for this device, so keep polling it normally
+            self._live.discard(message.get('id'))
+            self._update_health()
+        elif msg_type == 'complete':
+            # The server ended this device's stream; reconnect to resubscribe
+            _LOGGER.debug("Subscription for %s completed by server", message.get('id'))
+            self._live.discard(message.get('id'))
+            self._update_health()
+            await ws.close()
@@ -0,0 +1,94 @@
+import json
+import logging
+import aiohttp
+from .exceptions import DeadlineExceeded, KonnectTransportError
+
+_LOGGER = logging.getLogger(__name__)
+
+# Connection pool sizing for the shared session. The Konnect cloud is reached
+# through two hosts (GraphQL and the mobile REST API) so a small pool is plenty.
+POOL_LIMIT = 10
+POOL_LIMIT_PER_HOST = 4
+KEEPALIVE_TIMEOUT = 60  # seconds an idle connection is kept open
+
+# Every request is bounded so a stalled connection can't hold a caller forever
+CONNECT_TIMEOUT = 10  # seconds to get a connection, including TLS
+READ_TIMEOUT = 20  # seconds without receiving any data
+REQUEST_TIMEOUT = 30  # seconds for the whole request
+
+
+class KonnectResponse:
+    """Minimal response wrapper mirroring the parts of requests.Response we use."""
+
+    __slots__ = ("status_code", "text", "headers")
+
+    def __init__(self, status_code, text, headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class KonnectTransport:
+    """Async HTTP transport backed by one pooled, keep-alive aiohttp session."""
+
+    def __init__(self, session=None):
+        # A caller-supplied session is used as-is and never closed by us
+        self._session = session
+        self._owns_session = session is None
+        self._closed = False
+
+    def _get_session(self):
+        if self._closed:
+            # Don't open a session nobody will close for a straggling request
+            raise KonnectTransportError("Konnect transport is closed")
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=POOL_LIMIT,
+                limit_per_host=POOL_LIMIT_PER_HOST,
+                keepalive_timeout=KEEPALIVE_TIMEOUT)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self._timeout())
+            self._owns_session = True
+            _LOGGER.debug("Created pooled HTTP session for Konnect API")
+        return self._session
+
+    @staticmethod
+    def _timeout(deadline=None):
+        total = REQUEST_TIMEOUT
+        if deadline is not None:
+            if deadline.expired:
+                raise DeadlineExceeded("Deadline exceeded before the request was sent")
+            total = min(total, deadline.remaining)
+        return aiohttp.ClientTimeout(total=total, connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT)
+
+    async def request(self, method, url, json=None, headers=None, deadline=None):
+        """Send a request and return a fully read KonnectResponse.
+
+        The request is bounded by the transport timeouts and, if given, by
+        whatever is left of deadline. Timeouts raise asyncio.TimeoutError.
+        """
+        session = self._get_session()
+        # Set per request as a caller-supplied session may have no timeouts at all
+        timeout = self._timeout(deadline)
+        async with session.request(method, url, json=json, headers=headers, timeout=timeout) as response:
+            text = await response.text()
+            return KonnectResponse(response.status, text, dict(response.headers))
+
+    async def get(self, url, headers=None, deadline=None):
+        return await self.request("GET", url, headers=headers, deadline=deadline)
+
+    async def post(self, url, json=None, headers=None, deadline=None):
+        return await self.request("POST", url, json=json, headers=headers, deadline=deadline)
+
+    def ws_connect(self, url, protocols=(), heartbeat=None):
+        """Open a websocket on the shared session (use as an async context manager)."""
+        return self._get_session().ws_connect(url, protocols=protocols, heartbeat=heartbeat)
+
+    async def close(self):
+        """Close the underlying session if we created it, and refuse any further requests."""
+        self._closed = True
+        if self._owns_session and self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -9,9 +9,9 @@ from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers.entity import DeviceInfo
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
-from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
 from . import AndersenEvCoordinator
+from .entity import AndersenEvEntity
 from .const import DOMAIN
 
 _LOGGER = logging.getLogger(__name__)
@@ -30,9 +30,12 @@ async def async_setup_entry(
     async_add_entities(entities)
 
 
-class AndersenEvLock(CoordinatorEntity, LockEntity):
+class AndersenEvLock(AndersenEvEntity, LockEntity):
     """Representation of an Andersen EV charging lock."""
 
+    # deviceStatus fields this entity reads
+    _status_fields = ('sysUserLock',)
+
     def __init__(self, coordinator: AndersenEvCoordinator, device) -> None:
         """Initialize the lock."""
         super().__init__(coordinator)
@@ -52,66 +55,65 @@ class AndersenEvLock(CoordinatorEntity, LockEntity):
     def _update_model_from_device_status(self):
         """Update model information from device status if available."""
         # First try to use the model name from the API if available
-        if hasattr(self._device, 'model_name') and self._device.model_name:
+        if self._device.model_name:
             self._attr_device_info["model"] = self._device.model_name
         # Fall back to the information from device status
-        elif hasattr(self._device, '_last_status') and self._device._last_status:
-            status = self._device._last_status
-            if "sysProductName" in status:
-                self._attr_device_info["model"] = status["sysProductName"]
-            elif "sysProductId" in status:
-                self._attr_device_info["model"] = status["sysProductId"]
-            elif "sysHwVersion" in status:
-                self._attr_device_info["model"] = f"A2 (HW: {status['sysHwVersion']})"
+        elif self._device.status and self._device.status.model:
+            self._attr_device_info["model"] = self._device.status.model
 
     @property
     def available(self) -> bool:
         """Return if entity is available."""
-        for device in self.coordinator.data:
-            if device.device_id == self._device.device_id:
-                self._device = device
-                # Try to update model info if we have device status
-                self._update_model_from_device_status()
-                return True
+        device = self.coordinator.get_device(self._device.device_id)
+        if device is None:
+            # Device no longer exists
+            return False
         
-        # Device no longer exists
-        return False
+        self._device = device
+        # Try to update model info if we have device status
+        self._update_model_from_device_status()
+        return super().available
 
     @property
     def is_locked(self) -> bool:
         """Return true if the lock is locked (charging disabled)."""
-        for device in self.coordinator.data:
-            if device.device_id == self._device.device_id:
-                self._device = device
-                
-                # Get most recent device status from coordinator data
-                for device in self.coordinator.data:
-                    if device.device_id == self._device.device_id:
-                        try:
-                            # We'll check the last known state from coordinator
-                            # This works because the coordinator refreshes regularly
-                            # and we also refresh after lock/unlock actions
-                            if hasattr(device, '_last_status') and device._last_status:
-                                if 'sysUserLock' in device._last_status:
-                                    _LOGGER.debug(f"Device {device.friendly_name} sysUserLock state: {device._last_status['sysUserLock']}")
-                                    return device._last_status['sysUserLock']
-                        except Exception as err:
-                            _LOGGER.error(f"Error getting lock state: {err}")
-                
-                # Fallback to the device's user_lock property
-                return not device.user_lock  # Inverted because enabled=unlocked, disabled=locked
+        device = self.coordinator.get_device(self._device.device_id)
+        if device is None:
+            # Device no longer exists
+            return False
+        
+        self._device = device
+        
+        # We'll check the last known state from coordinator
+        # This works because the coordinator refreshes regularly
+        # and we also refresh after lock/unlock actions
+        status = self.coordinator.get_status(device.device_id)
+        if status and status.user_lock is not None:
+            _LOGGER.debug(f"Device {device.friendly_name} sysUserLock state: {status.user_lock}")
+            return status.user_lock
         
-        # Device no longer exists
-        return False
+        # Fallback to the device's user_lock property
+        return not device.user_lock  # Inverted because enabled=unlocked, disabled=locked
 
     async def async_lock(self, **kwargs: Any) -> None:
         """Lock the charging station (disable charging)."""
-        await self._device.disable()
         _LOGGER.debug(f"Locking device {self._device.friendly_name} (disabling charging)")
-        await self.coordinator.async_request_refresh()
+        await self._async_set_locked(True)
 
     async def async_unlock(self, **kwargs: Any) -> None:
         """Unlock the charging station (enable charging)."""
-        await self._device.enable()
         _LOGGER.debug(f"Unlocking device {self._device.friendly_name} (enabling charging)")
-        await self.coordinator.async_request_refresh()
\ No newline at end of file
+        await self._async_set_locked(False)
+
+    async def _async_set_locked(self, locked: bool) -> None:
+        """Show the new lock state straight away and confirm it with this charger only."""
+        device = self._device
+        await self.coordinator.async_run_command(
+            device,
+            device.disable if locked else device.enable,
+            # Lock and unlock replace each other while waiting in the queue
+            key="lock",
+            optimistic=lambda current: current._merge_status({"sysUserLock": locked}),
+            confirmed=lambda status: status.user_lock == locked,
+            fields=("sysUserLock",),
+        )
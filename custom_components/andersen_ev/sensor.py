@@ -2,7 +2,6 @@
 from __future__ import annotations
 import logging
 from datetime import datetime
-import dateutil.parser
 
 from homeassistant.components.sensor import (
     SensorDeviceClass,
@@ -12,8 +11,8 @@ from homeassistant.components.sensor import (
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
-from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from homeassistant.const import (
+    EntityCategory,
     UnitOfEnergy,
     UnitOfPower,
     UnitOfTime,
@@ -22,10 +21,30 @@ from homeassistant.const import (
 )
 
 from . import AndersenEvCoordinator
-from .const import DOMAIN
+from .entity import AndersenEvEntity
+from .const import DOMAIN, LAST_CHARGE_KEY, COMMAND_QUEUE_KEY, UPDATED_KEY, ATTR_FIELDS_UPDATED
+from .konnect.status import (
+    EVSE_STATE_READY,
+    EVSE_STATE_CONNECTED,
+    EVSE_STATE_CHARGING,
+    EVSE_STATE_ERROR,
+    EVSE_STATE_SLEEPING,
+    EVSE_STATE_DISABLED,
+    parse_timestamp,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
+# Map evseState values to connector states
+CONNECTOR_STATES = {
+    EVSE_STATE_READY: "Ready",
+    EVSE_STATE_CONNECTED: "Connected",
+    EVSE_STATE_CHARGING: "Charging",
+    EVSE_STATE_ERROR: "Error",
+    EVSE_STATE_SLEEPING: "Sleeping",
+    EVSE_STATE_DISABLED: "Disabled",
+}
+
 async def async_setup_entry(
     hass: HomeAssistant,
     entry: ConfigEntry,
@@ -110,11 +129,17 @@ async def async_setup_entry(
             coordinator, device, "session_start", "Session Start Time", "start",
             SensorDeviceClass.TIMESTAMP, None, None, "mdi:clock-start"
         ))
+        
+        # Command queue diagnostics
+        entities.append(AndersenEvCommandQueueSensor(coordinator, device))
+        
+        # When the cloud last confirmed the device's status
+        entities.append(AndersenEvLastUpdatedSensor(coordinator, device))
     
     async_add_entities(entities)
 
 
-class AndersenEvBaseSensor(CoordinatorEntity, SensorEntity):
+class AndersenEvBaseSensor(AndersenEvEntity, SensorEntity):
     """Base class for Andersen EV sensors."""
 
     def __init__(self, coordinator: AndersenEvCoordinator, device, sensor_type, name_suffix, data_key=None) -> None:
@@ -131,37 +156,31 @@ class AndersenEvBaseSensor(CoordinatorEntity, SensorEntity):
             "manufacturer": "Andersen EV",
             "model": "A2",  # Default model, will be updated if available from device status
         }
-        self._last_charge = None
         self._update_model_from_device_status()
 
-    async def async_added_to_hass(self) -> None:
-        """When entity is added to hass."""
-        await super().async_added_to_hass()
-        # Update last charge data
-        await self._update_last_charge()
+    # Only the shared last charge session feeds these sensors
+    _source_keys = (LAST_CHARGE_KEY,)
+
+    @property
+    def _last_charge(self):
+        """Return the last charge data shared through the coordinator."""
+        return self.coordinator.last_charges.get(self._device.device_id)
 
     def _update_model_from_device_status(self):
         """Update model information from device status if available."""
         # First try to use the model name from the API if available
-        if hasattr(self._device, 'model_name') and self._device.model_name:
+        if self._device.model_name:
             self._attr_device_info["model"] = self._device.model_name
         # Fall back to the information from device status
-        elif hasattr(self._device, '_last_status') and self._device._last_status:
-            status = self._device._last_status
-            if "sysProductName" in status:
-                self._attr_device_info["model"] = status["sysProductName"]
-            elif "sysProductId" in status:
-                self._attr_device_info["model"] = status["sysProductId"]
-            elif "sysHwVersion" in status:
-                self._attr_device_info["model"] = f"A2 (HW: {status['sysHwVersion']})"
+        elif self._device.status and self._device.status.model:
+            self._attr_device_info["model"] = self._device.status.model
 
     async def _update_last_charge(self):
-        """Get the last charge data for the device."""
-        self._last_charge = await self._device.getLastCharge()
+        """Refresh the shared last charge data if it has expired."""
+        await self.coordinator.async_get_last_charge(self._device)
         
         # Try to update the model with the latest device status
-        if hasattr(self._device, '_last_status'):
-            self._update_model_from_device_status()
+        self._update_model_from_device_status()
 
     async def async_update(self):
         """Update the entity.
@@ -175,7 +194,7 @@ class AndersenEvBaseSensor(CoordinatorEntity, SensorEntity):
     def available(self) -> bool:
         """Return if the sensor is available."""
         # We need to override this because the last charge might be None
-        return self.coordinator.last_update_success and self._last_charge is not None
+        return super().available and self._last_charge is not None
 
 
 class AndersenEvEnergySensor(AndersenEvBaseSensor):
@@ -220,9 +239,12 @@ class AndersenEvCostSensor(AndersenEvBaseSensor):
             return self._last_charge[self._data_key]
         return None
 
-class AndersenEvConnectorSensor(CoordinatorEntity, SensorEntity):
+class AndersenEvConnectorSensor(AndersenEvEntity, SensorEntity):
     """Sensor for Andersen EV connector state."""
 
+    # deviceStatus fields this entity reads
+    _status_fields = ('evseState',)
+
     _attr_device_class = SensorDeviceClass.ENUM
     _attr_options = ["Ready", "Connected", "Charging", "Error", "Sleeping", "Disabled", "unknown"]
     
@@ -249,65 +271,44 @@ class AndersenEvConnectorSensor(CoordinatorEntity, SensorEntity):
     def _update_model_from_device_status(self):
         """Update model information from device status if available."""
         # First try to use the model name from the API if available
-        if hasattr(self._device, 'model_name') and self._device.model_name:
+        if self._device.model_name:
             self._attr_device_info["model"] = self._device.model_name
         # Fall back to the information from device status
-        elif hasattr(self._device, '_last_status') and self._device._last_status:
-            status = self._device._last_status
-            if "sysProductName" in status:
-                self._attr_device_info["model"] = status["sysProductName"]
-            elif "sysProductId" in status:
-                self._attr_device_info["model"] = status["sysProductId"]
-            elif "sysHwVersion" in status:
-                self._attr_device_info["model"] = f"A2 (HW: {status['sysHwVersion']})"
+        elif self._device.status and self._device.status.model:
+            self._attr_device_info["model"] = self._device.status.model
     
     @property
     def available(self) -> bool:
         """Return if the sensor is available."""
         # Always available if the coordinator and device are available
-        for device in self.coordinator.data:
-            if device.device_id == self._device.device_id:
-                self._device = device
-                return self.coordinator.last_update_success
-        return False
+        device = self.coordinator.get_device(self._device.device_id)
+        if device is None:
+            return False
+        self._device = device
+        return super().available
     
     @property
     def native_value(self) -> str:
         """Return the connector state based on evseState."""
         # Check if device exists in coordinator data and update reference
-        for device in self.coordinator.data:
-            if device.device_id == self._device.device_id:
-                self._device = device
-                break
+        device = self.coordinator.get_device(self._device.device_id)
+        if device is not None:
+            self._device = device
                 
         # Check if the device has status information
-        if hasattr(self._device, '_last_status') and self._device._last_status:
-            status = self._device._last_status
-            if 'evseState' in status:
-                evse_state = status['evseState']
-                
-                # Log if evse_state changes to help debugging
-                if self._last_evse_state != evse_state:
-                    _LOGGER.debug(f"EVSE state changed from {self._last_evse_state} to {evse_state} for {self._device.friendly_name}")
-                    self._last_evse_state = evse_state
-                
-                # Map evseState values to connector states
-                if evse_state == "1" or evse_state == 1:
-                    self._connector_state = "Ready"
-                elif evse_state == "2" or evse_state == 2:
-                    self._connector_state = "Connected"
-                elif evse_state == "3" or evse_state == 3:
-                    self._connector_state = "Charging"
-                elif evse_state == "4" or evse_state == 4:
-                    self._connector_state = "Error"
-                elif evse_state == "254" or evse_state == 254:
-                    self._connector_state = "Sleeping"
-                elif evse_state == "255" or evse_state == 255:
-                    self._connector_state = "Disabled"
-                else:
-                    # Log unknown states for debugging
-                    _LOGGER.debug(f"Unknown EVSE state: {evse_state} for {self._device.friendly_name}")
-                    self._connector_state = "unknown"
+        status = self._device.status
+        if status and status.evse_state is not None:
+            evse_state = status.evse_state
+            
+            # Log if evse_state changes to help debugging
+            if self._last_evse_state != evse_state:
+                _LOGGER.debug(f"EVSE state changed from {self._last_evse_state} to {evse_state} for {self._device.friendly_name}")
+                self._last_evse_state = evse_state
+            
+            self._connector_state = CONNECTOR_STATES.get(evse_state, "unknown")
+            if evse_state not in CONNECTOR_STATES:
+                # Log unknown states for debugging
+                _LOGGER.debug(f"Unknown EVSE state: {evse_state} for {self._device.friendly_name}")
         
         return self._connector_state
 
@@ -322,9 +323,10 @@ class AndersenEvConnectorSensor(CoordinatorEntity, SensorEntity):
             
             # This will make the connector sensor more responsive
             # by getting the most up-to-date status directly from the API
-            status = await self._device.getDetailedDeviceStatus()
-            if status and 'evseState' in status:
-                evse_state = status['evseState']
+            await self.coordinator.async_refresh_device(self._device)
+            status = self._device.status
+            if status and status.evse_state is not None:
+                evse_state = status.evse_state
                 if self._last_evse_state != evse_state:
                     _LOGGER.debug(f"Direct API call: EVSE state changed to {evse_state} for {self._device.friendly_name}")
                     self._last_evse_state = evse_state
@@ -332,9 +334,17 @@ class AndersenEvConnectorSensor(CoordinatorEntity, SensorEntity):
             _LOGGER.debug(f"Error updating connector state: {err}")
 
 
-class AndersenEvChargeStatusSensor(CoordinatorEntity, SensorEntity):
+class AndersenEvChargeStatusSensor(AndersenEvEntity, SensorEntity):
     """Sensor for Andersen EV charge status values."""
 
+    # deviceStatus fields this entity reads
+    _status_fields = ('chargeStatus',)
+
+    @property
+    def _source_keys(self):
+        """Only the one chargeStatus value this sensor shows."""
+        return (f"chargeStatus.{self._data_key}",)
+
     def __init__(self, coordinator: AndersenEvCoordinator, device, sensor_type, name_suffix, data_key, 
                  device_class=None, state_class=None, unit=None, icon=None) -> None:
         """Initialize the sensor."""
@@ -363,54 +373,38 @@ class AndersenEvChargeStatusSensor(CoordinatorEntity, SensorEntity):
     def _update_model_from_device_status(self):
         """Update model information from device status if available."""
         # First try to use the model name from the API if available
-        if hasattr(self._device, 'model_name') and self._device.model_name:
+        if self._device.model_name:
             self._attr_device_info["model"] = self._device.model_name
         # Fall back to the information from device status
-        elif hasattr(self._device, '_last_status') and self._device._last_status:
-            status = self._device._last_status
-            if "sysProductName" in status:
-                self._attr_device_info["model"] = status["sysProductName"]
-            elif "sysProductId" in status:
-                self._attr_device_info["model"] = status["sysProductId"]
-            elif "sysHwVersion" in status:
-                self._attr_device_info["model"] = f"A2 (HW: {status['sysHwVersion']})"
+        elif self._device.status and self._device.status.model:
+            self._attr_device_info["model"] = self._device.status.model
     
     @property
     def available(self) -> bool:
         """Return if the sensor is available."""
         # Always available if the coordinator and device are available
-        for device in self.coordinator.data:
-            if device.device_id == self._device.device_id:
-                self._device = device
-                # Check if chargeStatus exists in last_status
-                if (hasattr(self._device, '_last_status') and 
-                    self._device._last_status and 
-                    'chargeStatus' in self._device._last_status):
-                    return self.coordinator.last_update_success
+        device = self.coordinator.get_device(self._device.device_id)
+        if device is None:
+            return False
+        self._device = device
+        # Check if chargeStatus exists in last_status
+        status = self.coordinator.get_status(device.device_id)
+        if status and status.charge_status:
+            return super().available
         return False
     
     @property
     def native_value(self) -> float | int | str | None:
         """Return the sensor value."""
         # Check if device exists in coordinator data and update reference
-        for device in self.coordinator.data:
-            if device.device_id == self._device.device_id:
-                self._device = device
-                break
+        device = self.coordinator.get_device(self._device.device_id)
+        if device is not None:
+            self._device = device
         
-        # Check if the device has charge status information
-        if (hasattr(self._device, '_last_status') and 
-            self._device._last_status and 
-            'chargeStatus' in self._device._last_status and 
-            self._data_key in self._device._last_status['chargeStatus']):
-            value = self._device._last_status['chargeStatus'][self._data_key]
-            if self._attr_device_class == SensorDeviceClass.TIMESTAMP and isinstance(value, str):
-                try:
-                    return dateutil.parser.isoparse(value)
-                except ValueError:
-                    _LOGGER.debug(f"Error parsing timestamp: {value}")
-                    return None
-            return value
+        # Check if the device has charge status information (timestamps are already parsed)
+        status = self._device.status
+        if status and status.charge_status:
+            return status.charge_status.get(self._data_key)
         return None
 
     async def async_update(self) -> None:
@@ -424,11 +418,11 @@ class AndersenEvChargeStatusSensor(CoordinatorEntity, SensorEntity):
             
             # This will make the sensors more responsive
             # by getting the most up-to-date status directly from the API
-            await self._device.getDetailedDeviceStatus()
+            await self.coordinator.async_refresh_device(self._device)
         except Exception as err:
             _LOGGER.debug(f"Error updating charge status sensor: {err}")
             
-class AndersenEvLiveSensor(CoordinatorEntity, SensorEntity):
+class AndersenEvLiveSensor(AndersenEvEntity, SensorEntity):
     """Sensor for Andersen EV live status values."""
 
     def __init__(self, coordinator: AndersenEvCoordinator, device, sensor_type, name_suffix, data_key, 
@@ -438,6 +432,8 @@ class AndersenEvLiveSensor(CoordinatorEntity, SensorEntity):
         self._device = device
         self._sensor_type = sensor_type
         self._data_key = data_key
+        # deviceStatus fields this entity reads
+        self._status_fields = (data_key,)
         self._attr_name = f"{device.friendly_name} {name_suffix}"
         self._attr_unique_id = f"{device.device_id}_{sensor_type}"
         self._attr_device_info = {
@@ -459,53 +455,41 @@ class AndersenEvLiveSensor(CoordinatorEntity, SensorEntity):
     def _update_model_from_device_status(self):
         """Update model information from device status if available."""
         # First try to use the model name from the API if available
-        if hasattr(self._device, 'model_name') and self._device.model_name:
+        if self._device.model_name:
             self._attr_device_info["model"] = self._device.model_name
         # Fall back to the information from device status
-        elif hasattr(self._device, '_last_status') and self._device._last_status:
-            status = self._device._last_status
-            if "sysProductName" in status:
-                self._attr_device_info["model"] = status["sysProductName"]
-            elif "sysProductId" in status:
-                self._attr_device_info["model"] = status["sysProductId"]
-            elif "sysHwVersion" in status:
-                self._attr_device_info["model"] = f"A2 (HW: {status['sysHwVersion']})"
+        elif self._device.status and self._device.status.model:
+            self._attr_device_info["model"] = self._device.status.model
     
     @property
     def available(self) -> bool:
         """Return if the sensor is available."""
         # Always available if the coordinator and device are available
-        for device in self.coordinator.data:
-            if device.device_id == self._device.device_id:
-                self._device = device
-                if (hasattr(self._device, '_last_status') and 
-                    self._device._last_status and
-                    self._data_key in self._device._last_status):
-                    _LOGGER.debug(f"Live available for {self._data_key} is {self.coordinator.last_update_success}")
-                    return self.coordinator.last_update_success
+        device = self.coordinator.get_device(self._device.device_id)
+        if device is None:
+            return False
+        self._device = device
+        status = self.coordinator.get_status(device.device_id)
+        if status and self._data_key in status:
+            _LOGGER.debug(f"Live available for {self._data_key} is {super().available}")
+            return super().available
         return False
     
     @property
     def native_value(self) -> float | int | str | None:
         """Return the sensor value."""
         # Check if device exists in coordinator data and update reference
-        for device in self.coordinator.data:
-            if device.device_id == self._device.device_id:
-                self._device = device
-                break
+        device = self.coordinator.get_device(self._device.device_id)
+        if device is not None:
+            self._device = device
         
         # Check if the device has charge status information
-        if (hasattr(self._device, '_last_status') and 
-            self._device._last_status and 
-            self._data_key in self._device._last_status):
-            value = self._device._last_status[self._data_key]
+        status = self._device.status
+        if status and self._data_key in status:
+            value = status.get(self._data_key)
             _LOGGER.debug(f"(Live value for {self._data_key} is {value}")
-            if hasattr (self, '_attr_device_class') and self._attr_device_class == SensorDeviceClass.TIMESTAMP and isinstance(value, str):
-                try:
-                    return dateutil.parser.isoparse(value)
-                except ValueError:
-                    _LOGGER.debug(f"Error parsing timestamp: {value}")
-                    return None
+            if self.device_class == SensorDeviceClass.TIMESTAMP:
+                return parse_timestamp(value)
             return value
         return None
 
@@ -520,8 +504,99 @@ class AndersenEvLiveSensor(CoordinatorEntity, SensorEntity):
             
             # This will make the sensors more responsive
             # by getting the most up-to-date status directly from the API
-            await self._device.getDetailedDeviceStatus()
+            await self.coordinator.async_refresh_device(self._device)
         except Exception as err:
             _LOGGER.debug(f"Error updating live detailed status sensor: {err}")
             
-            
\ No newline at end of file
+            
+
+
+class AndersenEvCommandQueueSensor(AndersenEvEntity, SensorEntity):
+    """Diagnostic sensor for the commands waiting to be sent to a charger."""
+
+    _source_keys = (COMMAND_QUEUE_KEY,)
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_icon = "mdi:tray-full"
+
+    def __init__(self, coordinator: AndersenEvCoordinator, device) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator)
+        self._device = device
+        self._attr_name = f"{device.friendly_name} Command Queue"
+        self._attr_unique_id = f"{device.device_id}_command_queue"
+        self._attr_device_info = {
+            "identifiers": {(DOMAIN, device.device_id)},
+            "name": f"{device.friendly_name} ({device.device_id})",
+            "manufacturer": "Andersen EV",
+        }
+
+    @property
+    def available(self) -> bool:
+        """Return if the sensor is available."""
+        return self.coordinator.get_device(self._device.device_id) is not None and super().available
+
+    @property
+    def native_value(self) -> int:
+        """Return the number of commands waiting or running."""
+        return self.coordinator.get_command_queue(self._device.device_id).depth
+
+    @property
+    def extra_state_attributes(self):
+        """Return command latency and counts."""
+        stats = self.coordinator.get_command_queue(self._device.device_id).stats()
+        return {
+            **(super().extra_state_attributes or {}),
+            "last_latency": None if stats["last_latency"] is None else round(stats["last_latency"], 3),
+            "average_latency": None if stats["average_latency"] is None else round(stats["average_latency"], 3),
+            "processed": stats["processed"],
+            "superseded": stats["superseded"],
+        }
+
+
+class AndersenEvLastUpdatedSensor(AndersenEvEntity, SensorEntity):
+    """Diagnostic sensor for when the cloud last confirmed a charger's status.
+
+    The per-field times are an attribute of this one entity, rather than of
+    every entity, so other entities only write state when their value changes.
+    """
+
+    _source_keys = (UPDATED_KEY,)
+    # Refreshed on every poll, there's no point keeping a history of them
+    _unrecorded_attributes = frozenset({ATTR_FIELDS_UPDATED})
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_device_class = SensorDeviceClass.TIMESTAMP
+    _attr_icon = "mdi:cloud-clock"
+
+    def __init__(self, coordinator: AndersenEvCoordinator, device) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator)
+        self._device = device
+        self._attr_name = f"{device.friendly_name} Last Updated"
+        self._attr_unique_id = f"{device.device_id}_last_updated"
+        self._attr_device_info = {
+            "identifiers": {(DOMAIN, device.device_id)},
+            "name": f"{device.friendly_name} ({device.device_id})",
+            "manufacturer": "Andersen EV",
+        }
+
+    @property
+    def available(self) -> bool:
+        """Stay available once the status expires, that's when its age matters most."""
+        return self.coordinator.get_device(self._device.device_id) is not None
+
+    @property
+    def native_value(self) -> datetime | None:
+        """Return when the device's status was last confirmed."""
+        return self.coordinator.device_updated.get(self._device.device_id)
+
+    @property
+    def extra_state_attributes(self):
+        """Return when each deviceStatus field was last confirmed."""
+        field_updated = self.coordinator.field_updated.get(self._device.device_id, {})
+        return {
+            **(super().extra_state_attributes or {}),
+            ATTR_FIELDS_UPDATED: {field: updated.isoformat() for field, updated in sorted(field_updated.items())},
+        }
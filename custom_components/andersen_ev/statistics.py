@@ -0,0 +1,214 @@
+"""Long-term statistics backfill for Andersen EV."""
+from __future__ import annotations
+import asyncio
+from datetime import datetime, timedelta
+import logging
+
+from homeassistant.components.recorder import get_instance
+from homeassistant.components.recorder.models import StatisticData, StatisticMetaData
+from homeassistant.components.recorder.statistics import (
+    async_add_external_statistics,
+    get_last_statistics,
+)
+from homeassistant.const import UnitOfEnergy
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util, slugify
+
+from .konnect.exceptions import KonnectError
+from .konnect.status import parse_timestamp
+from .const import (
+    DOMAIN,
+    STATISTICS_BACKFILL_DAYS,
+    STATISTICS_PAGE_SIZE,
+    STATISTICS_SAVE_DELAY,
+    STATISTICS_SETTLE_HOURS,
+    STATISTICS_STORAGE_KEY,
+    STATISTICS_WINDOW_DAYS,
+    STORAGE_VERSION,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+# Long-term statistics are hourly, so bins are requested at that resolution
+BIN_MINUTES = 60
+
+# Keys a bin's start time may be reported under
+TIME_KEYS = ("startDateTime", "dateTime", "timestamp", "time", "start")
+
+# Statistic suffix -> (energy key in kWh, average power key in W) within a bin
+SERIES = {
+    "charge_energy": ("chargeEnergy", "chargePower"),
+    "grid_energy": ("gridEnergy", "gridPower"),
+    "solar_energy": ("solarEnergy", "solarPower"),
+}
+
+
+def statistic_id(device_id: str, series: str) -> str:
+    """Return the external statistic id for one series of a device."""
+    return f"{DOMAIN}:{slugify(device_id)}_{series}"
+
+
+def _bin_start(power_bin: dict) -> datetime | None:
+    for key in TIME_KEYS:
+        start = parse_timestamp(power_bin.get(key))
+        if start is not None:
+            # The API reports local times without an offset
+            return dt_util.as_utc(start)
+    return None
+
+
+def _bin_energy(power_bin: dict, energy_key: str, power_key: str) -> float | None:
+    """Energy in kWh for a bin, from its energy total or else its average power."""
+    energy = power_bin.get(energy_key)
+    if isinstance(energy, (int, float)):
+        return float(energy)
+    power = power_bin.get(power_key)
+    if isinstance(power, (int, float)):
+        return power * BIN_MINUTES / 60 / 1000
+    return None
+
+
+def _bins(result) -> list:
+    """Normalise the untyped JSON result into a list of bins."""
+    if isinstance(result, list):
+        return [power_bin for power_bin in result if isinstance(power_bin, dict)]
+    if isinstance(result, dict):
+        for value in result.values():
+            if isinstance(value, list):
+                return _bins(value)
+    return []
+
+
+class AndersenEvStatisticsImporter:
+    """Imports binned power logs into external long-term statistics.
+
+    Each device gets one energy statistic per series. An import resumes from
+    the last hour the recorder already holds and walks forward a window at a
+    time, paging within the window, so restarts never re-import or skip bins.
+    How far each device's power logs have been fetched is stored as well, so
+    windows with nothing to import (an idle charger) aren't fetched again.
+    The last STATISTICS_SETTLE_HOURS are left for a later import, as the cloud
+    may not have filled their bins in yet.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Initialize the importer."""
+        self.hass = hass
+        self._store = Store(hass, STORAGE_VERSION, STATISTICS_STORAGE_KEY)
+        # device_id -> ISO time power logs have been fetched up to
+        self._fetched_until: dict | None = None
+        self._load_lock = asyncio.Lock()
+
+    async def _async_load(self) -> None:
+        async with self._load_lock:
+            if self._fetched_until is None:
+                self._fetched_until = await self._store.async_load() or {}
+
+    @callback
+    def _set_fetched_until(self, device_id: str, until: datetime) -> None:
+        self._fetched_until[device_id] = until.isoformat()
+        self._store.async_delay_save(lambda: self._fetched_until, STATISTICS_SAVE_DELAY)
+
+    async def _async_last(self, stat_id: str) -> tuple[datetime, float] | None:
+        last = await get_instance(self.hass).async_add_executor_job(
+            get_last_statistics, self.hass, 1, stat_id, True, {"sum"}
+        )
+        if not last or not last.get(stat_id):
+            return None
+        row = last[stat_id][0]
+        start = row["start"]
+        if not isinstance(start, datetime):
+            start = dt_util.utc_from_timestamp(start)
+        return start, row.get("sum") or 0.0
+
+    async def _async_fetch_window(self, device, start: datetime, end: datetime) -> list:
+        bins = []
+        offset = 0
+        while True:
+            result = await device.getPowerLogsBinned(
+                start.isoformat(), end.isoformat(), BIN_MINUTES, offset, STATISTICS_PAGE_SIZE
+            )
+            page = _bins(result)
+            bins.extend(page)
+            if len(page) < STATISTICS_PAGE_SIZE:
+                return bins
+            offset += STATISTICS_PAGE_SIZE
+
+    async def async_import(self, device) -> int:
+        """Import every settled hour since the last imported one; returns how many were added."""
+        await self._async_load()
+        now = dt_util.utcnow().replace(minute=0, second=0, microsecond=0)
+        now -= timedelta(hours=STATISTICS_SETTLE_HOURS)
+        stat_ids = {series: statistic_id(device.device_id, series) for series in SERIES}
+
+        # Resume from the series furthest behind so they all stay in step. A
+        # series the device never reports doesn't hold the others back.
+        lasts = {series: await self._async_last(stat_id) for series, stat_id in stat_ids.items()}
+        sums = {series: last[1] if last else 0.0 for series, last in lasts.items()}
+        imported_until = [last[0] for last in lasts.values() if last]
+        resume = now - timedelta(days=STATISTICS_BACKFILL_DAYS)
+        if imported_until:
+            resume = max(resume, min(imported_until) + timedelta(hours=1))
+        fetched_until = dt_util.parse_datetime(self._fetched_until.get(device.device_id) or "")
+        if fetched_until is not None:
+            resume = max(resume, fetched_until)
+
+        imported = 0
+        window_start = resume
+        while window_start < now:
+            window_end = min(window_start + timedelta(days=STATISTICS_WINDOW_DAYS), now)
+            try:
+                bins = await self._async_fetch_window(device, window_start, window_end)
+            except KonnectError as err:
+                _LOGGER.debug(f"Statistics import for {device.friendly_name} stopped early: {err}")
+                break
+
+            hourly = {}
+            for power_bin in bins:
+                start = _bin_start(power_bin)
+                if start is not None and window_start <= start < window_end:
+                    hourly[start] = power_bin
+
+            if bins and not any(
+                    _bin_energy(power_bin, energy_key, power_key) is not None
+                    for power_bin in hourly.values() for energy_key, power_key in SERIES.values()):
+                # The result is untyped, so bins we can't read mean its shape
+                # changed. Stop here rather than marking the window as done.
+                _LOGGER.warning(f"Statistics import for {device.friendly_name} stopped: none of "
+                                f"{len(bins)} power log bins could be read (keys: {sorted(bins[0])})")
+                break
+
+            statistics = {series: [] for series in SERIES}
+            for start in sorted(hourly):
+                for series, (energy_key, power_key) in SERIES.items():
+                    last = lasts[series]
+                    if last is not None and start <= last[0]:
+                        continue
+                    energy = _bin_energy(hourly[start], energy_key, power_key)
+                    if energy is None:
+                        continue
+                    sums[series] += energy
+                    statistics[series].append(StatisticData(start=start, state=energy, sum=sums[series]))
+
+            for series, rows in statistics.items():
+                if not rows:
+                    continue
+                metadata = StatisticMetaData(
+                    has_mean=False,
+                    has_sum=True,
+                    name=f"{device.friendly_name} {series.replace('_', ' ')}",
+                    source=DOMAIN,
+                    statistic_id=stat_ids[series],
+                    unit_of_measurement=UnitOfEnergy.KILO_WATT_HOUR,
+                )
+                async_add_external_statistics(self.hass, metadata, rows)
+                imported += len(rows)
+
+            # Empty windows count as done too, so they aren't asked for again
+            self._set_fetched_until(device.device_id, window_end)
+            window_start = window_end
+
+        if imported:
+            _LOGGER.debug(f"Imported {imported} hourly statistics for {device.friendly_name}")
+        return imported
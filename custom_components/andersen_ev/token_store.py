@@ -0,0 +1,62 @@
+"""Persistent auth token storage for Andersen EV."""
+from __future__ import annotations
+import asyncio
+import logging
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN, STORAGE_VERSION, STORAGE_KEY, TOKEN_SAVE_DELAY
+
+_LOGGER = logging.getLogger(__name__)
+
+DATA_TOKEN_STORE = "token_store"
+
+
+async def async_get_token_store(hass: HomeAssistant) -> AndersenEvTokenStore:
+    """Return the token store shared by all config entries, loading it once."""
+    token_store = hass.data[DOMAIN].get(DATA_TOKEN_STORE)
+    if token_store is None:
+        token_store = AndersenEvTokenStore(hass)
+        hass.data[DOMAIN][DATA_TOKEN_STORE] = token_store
+    await token_store.async_load()
+    return token_store
+
+
+class AndersenEvTokenStore:
+    """In-memory token map backed by one Store, written only when it changes."""
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Initialize the token store."""
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._data: dict | None = None
+        self._load_lock = asyncio.Lock()
+        self.dirty = False
+
+    async def async_load(self) -> None:
+        """Load the stored tokens the first time they are needed."""
+        async with self._load_lock:
+            if self._data is None:
+                self._data = await self._store.async_load() or {}
+
+    def get(self, entry_id: str) -> dict | None:
+        """Return the stored tokens for a config entry."""
+        return self._data.get(entry_id)
+
+    @callback
+    def async_set(self, entry_id: str, tokens: dict) -> bool:
+        """Update the tokens for a config entry, scheduling a save if they changed."""
+        if self._data.get(entry_id) == tokens:
+            return False
+        self._data[entry_id] = tokens
+        self.dirty = True
+        # Several changes within the delay (e.g. multiple entries) collapse into one write
+        self._store.async_delay_save(self._data_to_save, TOKEN_SAVE_DELAY)
+        _LOGGER.debug("Auth tokens changed, save scheduled")
+        return True
+
+    @callback
+    def _data_to_save(self) -> dict:
+        """Return the data to write, called by Store when the delayed save runs."""
+        self.dirty = False
+        return self._data